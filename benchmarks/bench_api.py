@@ -0,0 +1,234 @@
+"""Load test and micro-benchmarks for the API hot paths.
+
+Runs main:app in-process (httpx over ASGI, no network) against a scratch
+copy of data/, with the partner API replaced by a local stub, and reports
+throughput and p50/p95/p99 latency per scenario and table size.
+
+    python benchmarks/bench_api.py                          # 1k, 100k and 1M records
+    python benchmarks/bench_api.py --sizes 1000 --output bench.json
+    python benchmarks/bench_api.py --compare previous.json  # print the change per scenario
+
+Every table size runs in its own process, since the stores are loaded at
+import time.
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SIZES = [1000, 100000, 1000000]
+
+BENCH_USERNAME = "bench"
+BENCH_PASSWORD = "bench-password"
+BENCH_USER_ID = 9999
+# Requirements owned by the bench user, the rest belong to other users
+BENCH_USER_REQUIREMENTS = 50
+STUB_DESIGNS = 1000
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+# Send `iterations` requests with at most `concurrency` in flight
+async def measure(make_request, iterations: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(i):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            response = await make_request(i)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(iterations)])
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "iterations": iterations,
+        "concurrency": concurrency,
+        "errors": errors,
+        "throughput_rps": iterations / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+# Scratch working directory with the catalog, a seeded requirement log and
+# a users.json holding the bench user
+def prepare_workdir(size: int) -> str:
+    from passlib.hash import bcrypt
+
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    shutil.copytree(os.path.join(REPO_ROOT, "Frontend"), os.path.join(workdir, "Frontend"))
+    os.makedirs(os.path.join(workdir, "data"))
+    shutil.copy(os.path.join(REPO_ROOT, "data", "requirement.json"), os.path.join(workdir, "data"))
+
+    with open(os.path.join(REPO_ROOT, "data", "users.json")) as json_file:
+        users = json.load(json_file)
+    users.append({
+        "id": BENCH_USER_ID,
+        "username": BENCH_USERNAME,
+        "password_hash": bcrypt.hash(BENCH_PASSWORD),
+        "is_admin": True,
+        "integrasi_token": "stub-token",
+    })
+    with open(os.path.join(workdir, "data", "users.json"), "w") as json_file:
+        json.dump(users, json_file)
+
+    metals, handles, types = ["Silver", "Stainless Steel"], ["Plastic", "Wood"], ["Spoon", "Fork", "Knife"]
+    with open(os.path.join(workdir, "data", "requirements.log"), "w") as log_file:
+        records = []
+        for id in range(1, size + 1):
+            records.append({
+                "id": id,
+                "username": BENCH_USERNAME if id <= BENCH_USER_REQUIREMENTS else f"user{id % 5000}",
+                "metal": metals[id % 2],
+                "handle": handles[(id // 2) % 2],
+                "cutlery_type": types[id % 3],
+                "quantity": id % 100,
+                "image_url": "https://example.invalid/image.png",
+            })
+        log_file.write(json.dumps({"ops": [{"op": "put", "record": r} for r in records], "next_id": size + 1}) + "\n")
+    return workdir
+
+
+# Local stand-in for the partner API used by /home-design and /register
+def stub_partner_transport():
+    import httpx
+
+    designs = [{"desainname": f"{BENCH_USERNAME if i % 10 == 0 else 'other'}_{i}"} for i in range(STUB_DESIGNS)]
+
+    def handler(request):
+        if request.url.path == "/desain":
+            return httpx.Response(200, json=designs)
+        if request.url.path == "/token":
+            return httpx.Response(200, json={"access_token": "stub-token"})
+        return httpx.Response(200, json={})
+
+    return httpx.MockTransport(handler)
+
+
+async def run_scenarios(size: int, args) -> dict:
+    import httpx
+    import jwt
+
+    sys.path.insert(0, REPO_ROOT)
+    from main import app
+    import routes.auth
+    import routes.homeDesign
+
+    routes.auth.friends_api.transport = stub_partner_transport()
+    routes.homeDesign.design_api.transport = stub_partner_transport()
+    routes.auth.login_limiter.limit = 10 ** 9
+
+    token = jwt.encode({"sub": BENCH_USERNAME, "id": BENCH_USER_ID}, routes.auth.JWT_SECRET)
+    headers = {"Authorization": f"Bearer {token}"}
+    user_token = jwt.encode({"sub": "aish", "id": 4}, routes.auth.JWT_SECRET)
+    user_headers = {"Authorization": f"Bearer {user_token}"}
+    new_requirement = {"requirement_admin_data": {
+        "username": BENCH_USERNAME, "metal": "Silver", "handle": "Wood", "cutlery_type": "Fork", "quantity": 1
+    }}
+
+    scenarios = {
+        "POST /token": (lambda c, i: c.post("/token", data={"username": BENCH_USERNAME, "password": BENCH_PASSWORD}), args.token_iterations, 4),
+        "GET /users/me": (lambda c, i: c.get("/users/me", headers=headers), args.iterations, args.concurrency),
+        "GET /requirements/?limit=100": (lambda c, i: c.get("/requirements/?limit=100", headers=headers), args.iterations, args.concurrency),
+        "GET /requirements/?username=bench": (lambda c, i: c.get(f"/requirements/?username={BENCH_USERNAME}", headers=headers), args.iterations, args.concurrency),
+        "GET /requirements/ (regular user)": (lambda c, i: c.get("/requirements/", headers=user_headers), args.iterations, args.concurrency),
+        "GET /requirements/stats?group_by=metal,handle": (lambda c, i: c.get("/requirements/stats?group_by=metal,handle", headers=headers), args.iterations, args.concurrency),
+        "GET /requirements/{id}": (lambda c, i: c.get(f"/requirements/{1 + i % size}", headers=headers), args.iterations, args.concurrency),
+        "POST /requirements/new": (lambda c, i: c.post("/requirements/new", headers=headers, json=new_requirement), args.iterations, args.concurrency),
+        "GET /home-design/": (lambda c, i: c.get("/home-design/", headers=headers), args.iterations, args.concurrency),
+    }
+    if size <= args.full_listing_max:
+        scenarios["GET /requirements/ (all, admin)"] = (lambda c, i: c.get("/requirements/", headers=headers), args.full_listing_iterations, 1)
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name, (request, iterations, concurrency) in scenarios.items():
+            # Warm up caches and connection pools before measuring
+            await request(client, 0)
+            results[name] = await measure(lambda i: request(client, i), iterations, concurrency)
+    return results
+
+
+def run_worker(args):
+    workdir = prepare_workdir(args.size)
+    os.chdir(workdir)
+    try:
+        started = time.perf_counter()
+        results = asyncio.run(run_scenarios(args.size, args))
+        results["_startup_and_run_seconds"] = time.perf_counter() - started
+    finally:
+        os.chdir(REPO_ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+    json.dump(results, sys.stdout)
+
+
+def compare(previous: dict, current: dict):
+    for size, scenarios in current["sizes"].items():
+        for name, result in scenarios.items():
+            before = previous.get("sizes", {}).get(size, {}).get(name)
+            if not isinstance(result, dict) or not before:
+                continue
+            change = (result["p50_ms"] - before["p50_ms"]) / before["p50_ms"] * 100 if before["p50_ms"] else 0.0
+            print(f"{size:>8} {name:<40} p50 {before['p50_ms']:8.2f} -> {result['p50_ms']:8.2f} ms ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES))
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--token-iterations", type=int, default=20)
+    parser.add_argument("--full-listing-max", type=int, default=100000, help="largest table size for the unpaginated admin listing")
+    parser.add_argument("--full-listing-iterations", type=int, default=5)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="previous results file to compare against")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    report = {"created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": sys.version.split()[0], "sizes": {}}
+    for size in [int(size) for size in args.sizes.split(",")]:
+        command = [sys.executable, os.path.abspath(__file__), "--worker", "--size", str(size)] + sys.argv[1:]
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        report["sizes"][str(size)] = json.loads(output)
+        for name, result in report["sizes"][str(size)].items():
+            if isinstance(result, dict):
+                print(f"{size:>8} {name:<40} {result['throughput_rps']:9.1f} req/s  "
+                      f"p50 {result['p50_ms']:8.2f}  p95 {result['p95_ms']:8.2f}  p99 {result['p99_ms']:8.2f} ms"
+                      + (f"  ({result['errors']} errors)" if result["errors"] else ""))
+
+    with open(args.output, "w") as json_file:
+        json.dump(report, json_file, indent=4)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as json_file:
+            compare(json.load(json_file), report)
+
+
+if __name__ == "__main__":
+    main()
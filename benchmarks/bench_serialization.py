@@ -0,0 +1,80 @@
+"""Micro-benchmark of the requirement listing's response serialization.
+
+Compares, on the same page of records, what FastAPI does for a handler
+returning plain dicts with response_model=List[RequirementPartial] (validate
+every record, then dump the models) against the trusted path used by the
+routes (TrustedJSONResponse: one orjson dump of the stored records).
+
+    python benchmarks/bench_serialization.py
+    python benchmarks/bench_serialization.py --records 1000,100000 --repeat 5
+"""
+import argparse
+import os
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+
+def make_records(count: int) -> list:
+    metals, handles, types = ["Silver", "Stainless Steel"], ["Plastic", "Wood"], ["Spoon", "Fork", "Knife"]
+    return [{
+        "id": id,
+        "username": f"user{id % 5000}",
+        "metal": metals[id % 2],
+        "handle": handles[(id // 2) % 2],
+        "cutlery_type": types[id % 3],
+        "quantity": id % 100,
+        "image_url": "https://example.invalid/image.png",
+    } for id in range(1, count + 1)]
+
+
+# Best of `repeat` runs, in milliseconds
+def best_of(function, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", default="100,1000,10000,100000")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    from typing import List
+    from pydantic import TypeAdapter
+    from models.requirements import RequirementPartial
+    from services.serialization import TrustedJSONResponse, orjson
+
+    adapter = TypeAdapter(List[RequirementPartial])
+
+    # What serialize_response + JSONResponse amount to for this route
+    def validated(records):
+        models = adapter.validate_python(records)
+        return adapter.dump_json(models, exclude_unset=True)
+
+    def validated_twice(records):
+        # The old GET /requirements/{id} path: Requirement(**data) in the
+        # handler, dumped and validated again against response_model
+        models = [RequirementPartial(**record) for record in records]
+        return adapter.dump_json(adapter.validate_python([model.dict() for model in models]), exclude_unset=True)
+
+    def trusted(records):
+        return TrustedJSONResponse(records).body
+
+    print(f"orjson {'available' if orjson is not None else 'missing, using the json fallback'}")
+    for count in [int(count) for count in args.records.split(",")]:
+        records = make_records(count)
+        results = {name: best_of(lambda: function(records), args.repeat)
+                   for name, function in [("validated", validated), ("validated twice", validated_twice), ("trusted", trusted)]}
+        print(f"{count:>8} records  " + "  ".join(f"{name} {ms:9.2f} ms" for name, ms in results.items())
+              + f"  ({results['validated'] / results['trusted']:.1f}x faster than validated)")
+
+
+if __name__ == "__main__":
+    main()
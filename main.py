@@ -1,8 +1,10 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from routes.requirements import requirement_router, choice_router
-from routes.auth import auth_router
+from routes.auth import auth_router, registration_outbox
 from routes.homeDesign import home_design_router
 from fastapi.middleware.cors import CORSMiddleware
+from services.http_client import close_all_clients
+from services.metrics import MetricsMiddleware, render_metrics
 
 app = FastAPI()
 
@@ -13,9 +15,30 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Izinkan semua metode
     allow_headers=["*"],  # Izinkan semua header
+    expose_headers=["X-Next-After-Id"],  # Pagination cursor of GET /requirements/
 )
 
+# Per-route latency histograms and requests in flight, scraped from /metrics.
+# Added last so it wraps everything, CORS included.
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(requirement_router, prefix="/requirements")
 app.include_router(choice_router, prefix="/choices")
 app.include_router(home_design_router, prefix="/home-design")
-app.include_router(auth_router)  # Include the authentication router
\ No newline at end of file
+app.include_router(auth_router)  # Include the authentication router
+
+# Prometheus scrape endpoint; the numbers are per worker process
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(render_metrics(), media_type="text/plain; version=0.0.4")
+
+# Provision pending friend's API accounts in the background
+@app.on_event("startup")
+async def start_registration_outbox():
+    registration_outbox.start()
+
+# Stop the outbox worker and close the pooled partner connections when the server stops
+@app.on_event("shutdown")
+async def shutdown_background_work():
+    await registration_outbox.stop()
+    await close_all_clients()
@@ -1,4 +1,5 @@
 from pydantic import BaseModel
+from typing import List, Optional
 
 # Models
 class Metal(BaseModel):
@@ -11,6 +12,12 @@ class Cutlery_Type(BaseModel):
     type_id: int
     name: str
 
+# Every catalog list in one response, for the ordering form
+class Choices(BaseModel):
+    metals: List[Metal]
+    handles: List[Handle]
+    types: List[Cutlery_Type]
+
 class ReqInAdmin(BaseModel):
     username: str
     metal: str
@@ -24,6 +31,13 @@ class ReqInUser(BaseModel):
     cutlery_type: str
     quantity: int
 
+class ReqEdit(BaseModel):
+    id: int
+    metal: str
+    handle: str
+    cutlery_type: str
+    quantity: int
+
 class Requirement(BaseModel):
     id: int
     username: str
@@ -31,4 +45,31 @@ class Requirement(BaseModel):
     handle: str
     cutlery_type: str
     quantity: int
-    image_url: str 
\ No newline at end of file
+    image_url: str
+
+# Requirement with only the projected fields set (GET /requirements/?fields=...)
+class RequirementPartial(BaseModel):
+    id: int
+    username: Optional[str] = None
+    metal: Optional[str] = None
+    handle: Optional[str] = None
+    cutlery_type: Optional[str] = None
+    quantity: Optional[int] = None
+    image_url: Optional[str] = None
+
+# Order volume of one group (GET /requirements/stats); only the grouped and
+# filtered fields are set
+class RequirementStatsGroup(BaseModel):
+    username: Optional[str] = None
+    metal: Optional[str] = None
+    handle: Optional[str] = None
+    cutlery_type: Optional[str] = None
+    count: int
+    total_quantity: int
+
+# Outcome of one item of a bulk request
+class BulkItemResult(BaseModel):
+    index: int
+    id: Optional[int] = None
+    success: bool
+    detail: Optional[str] = None
@@ -1,4 +1,5 @@
 from pydantic import BaseModel
+from typing import Optional
 
 # Pydantic model for user registration
 class UserIn(BaseModel):
@@ -16,4 +17,11 @@ class UserJSON(BaseModel):
     username: str
     password_hash: str
     is_admin: bool
-    integrasi_token: str
+    integrasi_token: Optional[str] = None
+    # "pending" until the friend's API account is provisioned, then "active" (or "failed")
+    integration_status: str = "active"
+
+# Pydantic model for the partner provisioning status of a user
+class IntegrationStatus(BaseModel):
+    username: str
+    integration_status: str
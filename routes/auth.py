@@ -1,36 +1,60 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from passlib.hash import bcrypt
 import jwt
-import json
-from models.users import Token, UserIn, UserJSON
-import requests
+import os
+import time
+from models.users import Token, UserIn, UserJSON, IntegrationStatus
 from fastapi.templating import Jinja2Templates
+from storage.cache import LRUCache
+from storage.user_store import UsernameTaken, open_user_registry
+from services.password_hashing import hash_password, verify_password
+from services.rate_limit import RateLimiter
+from services.http_client import PartnerClient
+from services.outbox import Outbox, PermanentJobError
+from services.metrics import span
 
 # Corrected base URL with the http:// or https:// prefix
-FRIENDS_API_BASE_URL = "http://127.0.0.1:8000" 
+FRIENDS_API_BASE_URL = os.environ.get("FRIENDS_API_BASE_URL", "http://127.0.0.1:8000")
+# Shared pooled client for the friend's API
+friends_api = PartnerClient(FRIENDS_API_BASE_URL)
+REGISTRATION_OUTBOX_PATH = os.environ.get("REGISTRATION_OUTBOX_PATH", "data/registration_outbox.log")
 
-# Load user data from JSON file
-with open("data/users.json", "r") as json_file:
-    users_data = json.load(json_file)
+# Load user data (users.json or the shared SQLite database), indexed by id and username
+user_registry = open_user_registry()
+
+# Decoded JWT payloads keyed by the raw token
+token_cache = LRUCache(4096)
+
+# Failed login attempts allowed per username and client within the window (in seconds)
+LOGIN_RATE_LIMIT = int(os.environ.get("LOGIN_RATE_LIMIT", "5"))
+LOGIN_RATE_WINDOW = float(os.environ.get("LOGIN_RATE_WINDOW", "60"))
+login_limiter = RateLimiter(LOGIN_RATE_LIMIT, LOGIN_RATE_WINDOW)
 
 auth_router = APIRouter(tags=["Authentication"])
 JWT_SECRET = 'myjwtsecret'
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='token')
 
 
-# Function to write user data to JSON file
-def write_users_to_json():
-    with open("data/users.json", "w") as json_file:
-        json.dump(users_data, json_file, indent=4)
-
-# Function to authenticate and get user
-def authenticate_user(username: str, password: str):
-    for user in users_data:
-        if user['username'] == username and bcrypt.verify(password, user['password_hash']):
-            return user
+# Function to authenticate and get user, bcrypt runs in the hashing pool
+async def authenticate_user(username: str, password: str):
+    user = user_registry.get_by_username(username)
+    if user and await verify_password(password, user['password_hash']):
+        return user
     return None
 
+# Function to decode a token, cached until the token's own expiry (if any)
+def decode_token(token: str) -> dict:
+    cached = token_cache.get(token)
+    if cached is not None:
+        payload, expires_at = cached
+        if expires_at is None or time.time() < expires_at:
+            return payload
+        token_cache.pop(token)
+
+    payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
+    token_cache.put(token, (payload, payload.get('exp')))
+    return payload
+
 # OAuth2 password bearer for token authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='token')
 
@@ -42,8 +66,19 @@ async def login(request: Request):
 
 # Route to generate token
 @auth_router.post('/token', response_model=Token)
-async def generate_token(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = authenticate_user(form_data.username, form_data.password)
+async def generate_token(request: Request, form_data: OAuth2PasswordRequestForm = Depends()):
+    # Each attempt takes a hit before bcrypt runs, so a burst of concurrent
+    # attempts is limited too; a successful login clears them, so only
+    # failures add up. Keyed per username and client address, so nobody can
+    # lock other clients out.
+    limiter_key = f"{request.client.host if request.client else ''}:{form_data.username}"
+    if not login_limiter.allow(limiter_key):
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail='Too many failed login attempts, try again later'
+        )
+
+    user = await authenticate_user(form_data.username, form_data.password)
 
     if not user:
         raise HTTPException(
@@ -51,6 +86,7 @@ async def generate_token(form_data: OAuth2PasswordRequestForm = Depends()):
             detail='Invalid username or password'
         )
 
+    login_limiter.reset(limiter_key)
     token_data = {"sub": user['username'], "id": user['id']}
     token = jwt.encode(token_data, JWT_SECRET)
 
@@ -59,16 +95,17 @@ async def generate_token(form_data: OAuth2PasswordRequestForm = Depends()):
 # Dependency to get current user
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
-        user_id = payload.get('id')
-        user = next((u for u in users_data if u['id'] == user_id), None)
+        with span("auth.jwt_decode"):
+            payload = decode_token(token)
+        with span("auth.user_lookup"):
+            user = user_registry.get_model(payload.get('id'))  # Cached User Pydantic model
         if user is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED, 
                 detail='Invalid user'
             )
-        return UserJSON(**user)  # Convert user dictionary to User Pydantic model
-    except jwt.JWTError:
+        return user
+    except jwt.InvalidTokenError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, 
             detail='Invalid token'
@@ -79,34 +116,96 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
 async def get_user(user: UserJSON = Depends(get_current_user)):
     return user
 
-# Route to register a new user
+# Route to get the friend's API provisioning status of the current user
+@auth_router.get('/users/me/integration', response_model=IntegrationStatus)
+async def get_integration_status(user: UserJSON = Depends(get_current_user)):
+    return {"username": user.username, "integration_status": user.integration_status}
+
+# Route to register a new user. The user is committed locally right away;
+# the friend's API account and integration token are provisioned in the
+# background through the registration outbox. The job is queued first, so
+# a crash can never leave a committed user without its job.
 @auth_router.post('/register', response_model=UserJSON)
 async def register_user_and_friends(user: UserIn):
+    if user_registry.get_by_username(user.username) is not None:
+        raise username_taken()
+
     # Register the user in your own service
-    user_id = len(users_data) + 1
-    password_hash = bcrypt.hash(user.password)
+    password_hash = await hash_password(user.password)
     
     is_admin = False
     if user.username == "jazmy":
         is_admin = True
 
-    # Register the user in your friend's API using URL parameters
-    response = requests.post(f"{FRIENDS_API_BASE_URL}/users", params={"username": user.username, "password": user.password})
-    
-    if response.status_code != 200:
-        raise HTTPException(status_code=response.status_code, detail="Error registering user with your friend's API.")
-    
-    # Obtain a token from your friend's API
-    token_response = requests.post(f"{FRIENDS_API_BASE_URL}/token", data={"username": user.username, "password": user.password})
-    
-    if token_response.status_code == 200:
-        integrasi_token = token_response.json().get("access_token")
-    else:
-        raise HTTPException(status_code=token_response.status_code, detail="Error obtaining token from your friend's API.")
-    
-    # Store the integration token in your user data
-    new_user = {"id": user_id, "username": user.username, "password_hash": password_hash, "is_admin": is_admin, "integrasi_token": integrasi_token}
-    users_data.append(new_user)
-    write_users_to_json()
-    
+    # Queue the friend's API registration
+    await registration_outbox.add("create_partner_user", {"username": user.username, "password": user.password, "password_hash": password_hash}, wake=False)
+
+    new_user = {"id": None, "username": user.username, "password_hash": password_hash, "is_admin": is_admin, "integrasi_token": None, "integration_status": "pending"}
+    try:
+        new_user = await user_registry.add(new_user)
+    except UsernameTaken:
+        # Registered by a concurrent request (or another worker) meanwhile;
+        # the queued job sees it is not this registration's user and stops
+        raise username_taken()
+    registration_outbox.wake()
+
     return new_user
+
+def username_taken() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail='Username is already registered'
+    )
+
+# Function to check a response of the friend's API inside an outbox job
+def check_partner_response(response, action: str):
+    if response.status_code == 200:
+        return
+    if response.status_code < 500:
+        # The friend's API refused the request, retrying won't change that
+        raise PermanentJobError(f"{action} returned {response.status_code}")
+    raise RuntimeError(f"{action} returned {response.status_code}")
+
+# Function to find the pending user a registration job was queued for. The
+# password hash (salted, so unique to one registration) tells it apart from
+# a user who took the username after that registration failed.
+def registered_user(payload: dict):
+    user = user_registry.get_by_username(payload["username"])
+    if user is None or user["password_hash"] != payload["password_hash"] or user["integration_status"] != "pending":
+        return None
+    return user
+
+# Function to run one registration outbox job. The two partner calls are
+# separate jobs so a failed token request never re-creates the account.
+async def provision_partner_account(kind: str, payload: dict):
+    user = registered_user(payload)
+    if user is None:
+        if user_registry.get_by_username(payload["username"]) is None:
+            # Queued before the user is committed: retried until it is, and
+            # given up if the registration never committed it
+            raise RuntimeError(f"User {payload['username']} is not registered yet")
+        # Some other registration's user, or already provisioned
+        return
+
+    credentials = {"username": payload["username"], "password": payload["password"]}
+    if kind == "create_partner_user":
+        # Register the user in your friend's API using URL parameters
+        response = await friends_api.post("/users", params=credentials)
+        check_partner_response(response, "Registering user with your friend's API")
+        await registration_outbox.add("fetch_partner_token", payload)
+    elif kind == "fetch_partner_token":
+        # Obtain a token from your friend's API
+        token_response = await friends_api.post("/token", data=credentials)
+        check_partner_response(token_response, "Obtaining token from your friend's API")
+        integrasi_token = token_response.json().get("access_token")
+        # Store the integration token in your user data
+        await user_registry.update(user["id"], integrasi_token=integrasi_token, integration_status="active")
+
+async def mark_integration_failed(kind: str, payload: dict):
+    user = registered_user(payload)
+    if user is not None:
+        await user_registry.update(user["id"], integration_status="failed")
+
+# Durable queue of pending friend's API registrations (it holds the plain
+# password until the account is provisioned, so it is created as 0600)
+registration_outbox = Outbox(REGISTRATION_OUTBOX_PATH, provision_partner_account, mark_integration_failed)
@@ -1,10 +1,13 @@
 from fastapi import APIRouter, HTTPException, Depends, Form, status
 from fastapi.security import OAuth2PasswordBearer
-import requests
+import httpx
+import os
 from .auth import get_current_user
 from pydantic import BaseModel
 from models.users import UserJSON
 from routes.auth import get_current_user
+from services.http_client import CircuitOpenError, PartnerClient, partner_unavailable
+from services.design_cache import DesignCollectionCache
 
 class DesignData(BaseModel):
     designname: str
@@ -16,7 +19,42 @@ class DesignData(BaseModel):
 
 home_design_router = APIRouter(tags=["Home Design"])
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='token')
-FRIENDS_API_BASE_URL = "desainfastapiauth.dthyb2e7a7aneqb9.southeastasia.azurecontainer.io" 
+FRIENDS_API_BASE_URL = os.environ.get(
+    "DESIGN_API_BASE_URL",
+    "http://desainfastapiauth.dthyb2e7a7aneqb9.southeastasia.azurecontainer.io"
+)
+# Shared pooled client for the partner's design API
+design_api = PartnerClient(FRIENDS_API_BASE_URL)
+
+
+# Function to download the partner's whole design collection
+async def fetch_designs(integrasi_token: str) -> list:
+    headers = {"Authorization": f"Bearer {integrasi_token}"}
+    try:
+        response = await design_api.get("/desain", headers=headers)
+    except (CircuitOpenError, httpx.HTTPError) as exc:
+        raise partner_unavailable(exc)
+
+    if response.status_code != 200:
+        raise HTTPException(status_code=response.status_code, detail="Error retrieving home design.")
+    return response.json()
+
+
+# Function to get the user's token for the friend's service, which only
+# exists once the registration outbox has provisioned the account
+def require_integrasi_token(user: UserJSON) -> str:
+    if not user.integrasi_token:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Home design account is not ready yet (status: {user.integration_status})."
+        )
+    return user.integrasi_token
+
+
+# Seconds a fetched collection is fresh, and how much longer it may be served stale
+DESIGN_CACHE_TTL = float(os.environ.get("DESIGN_CACHE_TTL", "30"))
+DESIGN_CACHE_STALE_TTL = float(os.environ.get("DESIGN_CACHE_STALE_TTL", "300"))
+design_cache = DesignCollectionCache(fetch_designs, DESIGN_CACHE_TTL, DESIGN_CACHE_STALE_TTL)
 
 
 @home_design_router.post("/create")
@@ -31,7 +69,7 @@ async def create_home_design(
     user: UserJSON = Depends(get_current_user) 
 ):
     # Obtain the integrasi_token based on the user's token
-    integrasi_token = user.integrasi_token
+    integrasi_token = require_integrasi_token(user)
     
     # Use integrasi_token for authentication friend's service
     headers = {"Authorization": f"Bearer {integrasi_token}"}
@@ -45,10 +83,16 @@ async def create_home_design(
         "nohp": nohp,
     }
     
-    response = requests.post(f"{FRIENDS_API_BASE_URL}/alldata", data=form_data, headers=headers)
+    try:
+        response = await design_api.post("/alldata", data=form_data, headers=headers)
+    except (CircuitOpenError, httpx.HTTPError) as exc:
+        raise partner_unavailable(exc)
     
     if response.status_code != 200:
         raise HTTPException(status_code=response.status_code, detail="Error creating home design.")
+
+    # The cached collection no longer has every design
+    design_cache.invalidate()
     
     return response.json()
 
@@ -58,18 +102,5 @@ async def get_home_design(token: str = Depends(oauth2_scheme)):
     # Get the current user based on the token
     user = await get_current_user(token)
 
-    # Obtain the integrasi_token from the current user
-    integrasi_token = user.integrasi_token
-
-    # Use integrasi_token for authentication with friend's service
-    headers = {"Authorization": f"Bearer {integrasi_token}"}
-    response = requests.get(f"{FRIENDS_API_BASE_URL}/desain", headers=headers)
-
-    if response.status_code != 200:
-        raise HTTPException(status_code=response.status_code, detail="Error retrieving home design.")
-
-    # Filter the response data to include only designs that start with the user's username
-    designs = response.json()
-    user_designs = [design for design in designs if design['desainname'].startswith(user.username)]
-
-    return user_designs
\ No newline at end of file
+    # Designs are cached server-side and looked up by the user's username prefix
+    return await design_cache.designs_with_prefix(user.username, require_integrasi_token(user))
@@ -1,53 +1,148 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
-import json
-from models.requirements import Metal, Cutlery_Type, Handle, Requirement, ReqInUser, ReqInAdmin
+import csv
+import io
+import os
+from models.requirements import Metal, Cutlery_Type, Handle, Choices, Requirement, RequirementPartial, RequirementStatsGroup, ReqInUser, ReqInAdmin, ReqEdit, BulkItemResult
 from models.users import UserJSON
 from routes.auth import get_current_user
+from storage.requirement_stats import STATS_FIELDS
+from storage.requirement_store import RequirementNotFound, open_requirement_store
+from storage.catalog import get_catalog
+from services.serialization import TrustedJSONResponse, dumps
 
-# Load data from the JSON file
-with open("data/requirement.json", "r") as json_file:
-    data = json.load(json_file)
+# Requirements live in their own store, requirement.json only holds the catalog
+requirement_store = open_requirement_store()
 
-# Assign the tables
-requirements = data.get("requirement", [])
-metals = data.get("metals", [])
-handles = data.get("handles", [])
-cutlery_types = data.get("cutlery_types", [])
+# Number of requirements pulled from the store per chunk of a streamed export
+EXPORT_CHUNK_SIZE = 500
+
+# Seconds clients may reuse a catalog response before revalidating it
+CHOICES_MAX_AGE = int(os.environ.get("CHOICES_MAX_AGE", "60"))
 
 choice_router = APIRouter(tags=["Choices"])
 requirement_router = APIRouter(tags=["Requirements"])
 
 
 #GET
+# Pre-serialized catalog section with its ETag; 304 when the client's copy is current
+def choices_response(section: str, if_none_match: Optional[str]) -> Response:
+    body, etag = get_catalog().responses[section]
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={CHOICES_MAX_AGE}"}
+    if if_none_match and etag_matches(etag, if_none_match):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @choice_router.get("/metals", response_model=List[Metal])
-async def retrieve_all_metals() -> List[Metal]:
-    return metals
+async def retrieve_all_metals(if_none_match: Optional[str] = Header(None)) -> List[Metal]:
+    return choices_response("metals", if_none_match)
 
 @choice_router.get("/handles", response_model=List[Handle])
-async def retrieve_all_handles() -> List[Handle]:
-    return handles
+async def retrieve_all_handles(if_none_match: Optional[str] = Header(None)) -> List[Handle]:
+    return choices_response("handles", if_none_match)
 
 @choice_router.get("/types", response_model=List[Cutlery_Type])
-async def retrieve_all_cutlery_types() -> List[Cutlery_Type]:
-    return cutlery_types
+async def retrieve_all_cutlery_types(if_none_match: Optional[str] = Header(None)) -> List[Cutlery_Type]:
+    return choices_response("types", if_none_match)
+
+@choice_router.get("/all", response_model=Choices)
+async def retrieve_all_choices(if_none_match: Optional[str] = Header(None)) -> Choices:
+    return choices_response("all", if_none_match)
+
+# Requirement responses are the store's records as they are: they were
+# validated on the way in, so they skip the response_model round trip
+# (see TrustedJSONResponse) and are serialized once
+
+# Filters shared by the listing and the export
+def requirement_filters(
+    metal: Optional[str] = None,
+    handle: Optional[str] = None,
+    cutlery_type: Optional[str] = None,
+    username: Optional[str] = None,
+    min_quantity: Optional[int] = None,
+    max_quantity: Optional[int] = None
+) -> dict:
+    return {
+        "filters": {"username": username, "metal": metal, "handle": handle, "cutlery_type": cutlery_type},
+        "min_quantity": min_quantity,
+        "max_quantity": max_quantity
+    }
 
-@requirement_router.get("/", response_model=List[Requirement])
-async def retrieve_all_requirements(user: dict = Depends(get_current_user)) -> List[Requirement]:
-    # Check if the user is an admin
-    if user.is_admin:
-        return requirements  # Return all requirements for admin
-    else:
-        # Only return requirements for the authenticated user
-        user_requirements = [req for req in requirements if req.get("username") == user.username]
-        return user_requirements
+@requirement_router.get("/", response_model=List[RequirementPartial], response_model_exclude_unset=True)
+async def retrieve_all_requirements(
+    limit: Optional[int] = Query(None, ge=1),
+    after_id: int = 0,
+    fields: Optional[str] = Query(None, description="Comma separated fields to return, e.g. id,metal,quantity"),
+    criteria: dict = Depends(requirement_filters),
+    user: dict = Depends(get_current_user)
+) -> List[RequirementPartial]:
+    # Admins may filter on any user, everyone else only sees their own requirements
+    if not user.is_admin:
+        criteria["filters"]["username"] = user.username
+
+    page = requirement_store.query(after_id=after_id, limit=limit, **criteria)
+
+    # Cursor for the next page, pass it back as after_id
+    headers = {}
+    if limit is not None and len(page) == limit:
+        headers["X-Next-After-Id"] = str(page[-1]["id"])
+
+    if fields:
+        projection = project_fields(fields)
+        page = [{key: req[key] for key in projection if key in req} for req in page]
+    return TrustedJSONResponse(page, headers=headers)
+
+@requirement_router.get("/export")
+async def export_requirements(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    since_id: int = 0,
+    criteria: dict = Depends(requirement_filters),
+    user: UserJSON = Depends(get_current_user)
+):
+    if not user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins can export requirements"
+        )
+
+    if format == "csv":
+        return StreamingResponse(export_csv_lines(since_id, criteria), media_type="text/csv")
+    return StreamingResponse(export_ndjson_lines(since_id, criteria), media_type="application/x-ndjson")
+
+# Count and total quantity of requirements, per group of the given fields.
+# Served from aggregates the store keeps up to date on every write, so the
+# cost does not grow with the number of requirements.
+@requirement_router.get("/stats", response_model=List[RequirementStatsGroup], response_model_exclude_unset=True)
+async def requirement_stats(
+    group_by: Optional[str] = Query(None, description="Comma separated fields to group by, e.g. metal,username"),
+    metal: Optional[str] = None,
+    handle: Optional[str] = None,
+    cutlery_type: Optional[str] = None,
+    username: Optional[str] = None,
+    user: UserJSON = Depends(get_current_user)
+) -> List[RequirementStatsGroup]:
+    # Same rule as the listing: non-admins only see their own requirements
+    if not user.is_admin:
+        username = user.username
+
+    grouping = [field.strip() for field in (group_by or "").split(",") if field.strip()]
+    unknown = [field for field in grouping if field not in STATS_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Cannot group by: {', '.join(unknown)}"
+        )
+
+    filters = {"username": username, "metal": metal, "handle": handle, "cutlery_type": cutlery_type}
+    return TrustedJSONResponse(requirement_store.stats(filters, grouping))
 
 @requirement_router.get("/{id}", response_model=Requirement)
 async def retrieve_requirement(id: int, user: UserJSON = Depends(get_current_user)) -> Requirement:
     # Check if the user is an admin or if the requirement belongs to the authenticated user
-    requirement_data = next((req for req in requirements if req.get("id") == id), None)
-    if user.is_admin or (requirement_data and requirement_data.get("username") == user["username"]):
-        return Requirement(**requirement_data)
+    requirement_data = requirement_store.get(id)
+    if requirement_data and (user.is_admin or requirement_data.get("username") == user.username):
+        return TrustedJSONResponse(requirement_data)
     else:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -71,11 +166,8 @@ async def create_requirement(
                 detail="requirement_admin_data is required for admin user"
             )
 
-        validate_input(requirement_admin_data, handles, "handle")
-        validate_input(requirement_admin_data, metals, "metal")
-        validate_input(requirement_admin_data, cutlery_types, "cutlery_type")
+        validate_input(requirement_admin_data)
 
-        requirement_id = len(requirements) + 1
         image_url = get_image_url(
             requirement_admin_data.metal,
             requirement_admin_data.handle,
@@ -83,7 +175,7 @@ async def create_requirement(
         )
 
         new_requirement = {
-            "id": requirement_id,
+            "id": None,  # Assigned by the store when committed
             "username": requirement_admin_data.username,
             "metal": requirement_admin_data.metal,
             "handle": requirement_admin_data.handle,
@@ -98,12 +190,9 @@ async def create_requirement(
                 detail="requirement_user_data is required for regular user"
             )
 
-        validate_input(requirement_user_data, handles, "handle")
-        validate_input(requirement_user_data, metals, "metal")
-        validate_input(requirement_user_data, cutlery_types, "cutlery_type")
+        validate_input(requirement_user_data)
 
         username = user.username
-        requirement_id = len(requirements) + 1
         image_url = get_image_url(
             requirement_user_data.metal,
             requirement_user_data.handle,
@@ -111,7 +200,7 @@ async def create_requirement(
         )
 
         new_requirement = {
-            "id": requirement_id,
+            "id": None,  # Assigned by the store when committed
             "username": username,
             "metal": requirement_user_data.metal,
             "handle": requirement_user_data.handle,
@@ -120,12 +209,50 @@ async def create_requirement(
             "image_url": image_url
         }
 
-    requirements.append(new_requirement)
-    # Write the updated data to the JSON file
-    with open("data/requirement.json", "w") as json_file:
-        data["requirements"] = requirements
-        json.dump(data, json_file, indent=4)
-    return new_requirement
+    # Append the new requirement to the store
+    return TrustedJSONResponse(await requirement_store.insert(new_requirement))
+
+@requirement_router.post("/bulk", response_model=List[BulkItemResult])
+async def create_requirements_bulk(
+    requirement_user_data: Optional[List[ReqInUser]] = None,
+    requirement_admin_data: Optional[List[ReqInAdmin]] = None,
+    user: dict = Depends(get_current_user)
+):
+    items = requirement_admin_data if user.is_admin else requirement_user_data
+    if items is None:
+        field = "requirement_admin_data" if user.is_admin else "requirement_user_data"
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"{field} is required for {'admin' if user.is_admin else 'regular'} user"
+        )
+
+    catalog = get_catalog()
+    results = []
+    new_requirements = []
+    for index, item in enumerate(items):
+        errors = catalog.choice_errors(item)
+        if errors:
+            results.append({"index": index, "success": False, "detail": "; ".join(errors)})
+            continue
+
+        new_requirement = {
+            "id": None,
+            "username": item.username if user.is_admin else user.username,
+            "metal": item.metal,
+            "handle": item.handle,
+            "cutlery_type": item.cutlery_type,
+            "quantity": item.quantity,
+            "image_url": catalog.image_url(item.metal, item.handle, item.cutlery_type)
+        }
+        new_requirements.append(new_requirement)
+        results.append({"index": index, "success": True})
+
+    # All valid items are stored with one commit, which also assigns their ids
+    created = iter(await requirement_store.write_batch(new_requirements, []))
+    for result in results:
+        if result["success"]:
+            result["id"] = next(created)["id"]
+    return results
 
 
 
@@ -138,11 +265,9 @@ async def update_requirement(
     requirement_data: ReqInUser,  # Using ReqInUser model for input
     user: UserJSON = Depends(get_current_user)  # Authentication
 ):
-    validate_input(requirement_data, handles, "handle")
-    validate_input(requirement_data, metals, "metal")
-    validate_input(requirement_data, cutlery_types, "cutlery_type")
+    validate_input(requirement_data)
 
-    existing_requirement = next((req for req in requirements if req.get("id") == id), None)
+    existing_requirement = requirement_store.get(id)
 
     if not existing_requirement:
         raise HTTPException(
@@ -156,7 +281,8 @@ async def update_requirement(
             detail="You do not have permission to edit this requirement"
         )
 
-    # Update the fields, except 'username' and 'id'
+    # Update the fields on a copy, except 'username' and 'id'
+    existing_requirement = dict(existing_requirement)
     for key, value in requirement_data.dict().items():
         if key not in ["id", "username"]:
             existing_requirement[key] = value
@@ -165,12 +291,54 @@ async def update_requirement(
     image_url = get_image_url(requirement_data.metal, requirement_data.handle, requirement_data.cutlery_type)
     existing_requirement["image_url"] = image_url
 
-    # Write the updated data to the JSON file
-    with open("data/requirement.json", "w") as json_file:
-        data["requirements"] = requirements  # Ensure it's 'requirements' not 'requirement'
-        json.dump(data, json_file, indent=4)
+    # Commit the updated requirement to the store
+    try:
+        await requirement_store.update(existing_requirement)
+    except RequirementNotFound:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Requirement with supplied ID does not exist"
+        )
+
+    return TrustedJSONResponse(existing_requirement)
+
+@requirement_router.put("/bulk/edit", response_model=List[BulkItemResult])
+async def update_requirements_bulk(
+    requirement_data: List[ReqEdit],
+    user: UserJSON = Depends(get_current_user)
+):
+    catalog = get_catalog()
+    results = []
+    updated_requirements = {}
+    for index, item in enumerate(requirement_data):
+        existing_requirement = updated_requirements.get(item.id) or requirement_store.get(item.id)
+        errors = catalog.choice_errors(item)
+        if not existing_requirement:
+            errors.append("Requirement with supplied ID does not exist")
+        elif existing_requirement["username"] != user.username and not user.is_admin:
+            errors.append("You do not have permission to edit this requirement")
+        if errors:
+            results.append({"index": index, "id": item.id, "success": False, "detail": "; ".join(errors)})
+            continue
+
+        updated_requirements[item.id] = dict(
+            existing_requirement,
+            metal=item.metal,
+            handle=item.handle,
+            cutlery_type=item.cutlery_type,
+            quantity=item.quantity,
+            image_url=catalog.image_url(item.metal, item.handle, item.cutlery_type)
+        )
+        results.append({"index": index, "id": item.id, "success": True})
 
-    return Requirement(**existing_requirement)
+    try:
+        await requirement_store.write_batch(list(updated_requirements.values()), [])
+    except RequirementNotFound as exc:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Requirement {exc} was deleted while editing, nothing was saved"
+        )
+    return results
 
 #----------------------------------------------------------------#
 
@@ -180,7 +348,7 @@ async def delete_requirement(
     id: int,
     user: UserJSON = Depends(get_current_user)  # Adding authentication
 ):
-    requirement_to_delete = next((req for req in requirements if req.get("id") == id), None)
+    requirement_to_delete = requirement_store.get(id)
 
     if not requirement_to_delete or (requirement_to_delete["username"] != user.username and not user.is_admin):
         raise HTTPException(
@@ -188,51 +356,85 @@ async def delete_requirement(
             detail="You do not have permission to delete this requirement"
         )
 
-    requirements.remove(requirement_to_delete)
-    reassign_ids()  # Reassign IDs after deletion
-
-    # Update the JSON data file
-    with open("data/requirement.json", "w") as json_file:
-        data["requirement"] = requirements
-        json.dump(data, json_file, indent=4)
+    # Ids stay stable, the store only records a tombstone
+    await requirement_store.delete(id)
 
     return {
         "message": "Requirement deleted successfully"
     }
 
+@requirement_router.delete("/bulk/delete", response_model=List[BulkItemResult])
+async def delete_requirements_bulk(
+    ids: List[int] = Body(...),
+    user: UserJSON = Depends(get_current_user)
+):
+    results = []
+    deleted_ids = {}
+    for index, id in enumerate(ids):
+        requirement_to_delete = None if id in deleted_ids else requirement_store.get(id)
+        if not requirement_to_delete or (requirement_to_delete["username"] != user.username and not user.is_admin):
+            results.append({"index": index, "id": id, "success": False, "detail": "You do not have permission to delete this requirement"})
+            continue
+        deleted_ids[id] = None
+        results.append({"index": index, "id": id, "success": True})
+
+    await requirement_store.write_batch([], list(deleted_ids))
+    return results
+
 #----------------------------------------------------------------#
 
 #FUNCTIONS
-def validate_input(requirement_data: Requirement, name_list, field_name):
-    if requirement_data.dict().get(field_name) not in [name["name"] for name in name_list]:
+def validate_input(requirement_data):
+    errors = get_catalog().choice_errors(requirement_data)
+    if errors:
         raise HTTPException(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-            detail=f"{field_name} not found in the list"
+            detail="; ".join(errors)
         )
-    
-def get_image_url(metal: str, handle: str, cutlery_type: str) -> str:
-    # Define a dictionary that maps choices to image URLs
-    image_urls = {
-        ("Silver", "Plastic", "Spoon"): "https://cdn.discordapp.com/attachments/1170248640145670164/1170251885895221248/image.png?ex=65585cff&is=6545e7ff&hm=35ce0d41b0a05edd757f4933f7464cef81d86a5dbc7c5aa63d079d894eef86e6&",
-        ("Silver", "Plastic", "Fork"): "https://cdn.discordapp.com/attachments/1170248640145670164/1170251192945877022/2Q.png?ex=65585c5a&is=6545e75a&hm=10c864dd7a63859ba07959b8ea5412f17ef77af10c8d39dbd85253ddc4977ae1&",
-        ("Silver", "Plastic", "Knife"): "https://cdn.discordapp.com/attachments/1170248640145670164/1170248662912340029/51v6Oc0aJ4L.png?ex=655859ff&is=6545e4ff&hm=94d95f49a27416e26fe4b1ae956bb8031180dc249df6a6a86eab0fd46f8e8a18&",
-        ("Silver", "Wood", "Spoon"): "https://cdn.discordapp.com/attachments/1170248640145670164/1170251951238291598/stainless-steel-spoon-wood-handle-500x500.png?ex=65585d0f&is=6545e80f&hm=bf8d766da91daf6604761d99759a911585e254928a559b48236559999991002b&",
-        ("Silver", "Wood", "Fork"): "https://cdn.discordapp.com/attachments/1170248640145670164/1170250147846959114/DALLE_2023-11-04_13.35.31_-_wood_handle_silver_fork_with_white_background.png?ex=65585b61&is=6545e661&hm=f354bfa6fed8d52668e25bd139c6caaa75721ac651040c09bd436639b2db3210&",
-        ("Silver", "Wood", "Knife"): "https://cdn.discordapp.com/attachments/1170248640145670164/1170248812804178030/4b90bae6-95a3-4633-901c-dd2ea06d4079_1200x1200.png?ex=65585a23&is=6545e523&hm=3bdc221f66aa612d84fa3aa7342fc7fe4a05d4feebff2e71089e46217b1bea6c&",
-        ("Stainless Steel", "Plastic", "Spoon"): "https://cdn.discordapp.com/attachments/1170248640145670164/1170251787270377495/slpba211.png?ex=65585ce8&is=6545e7e8&hm=99166ab01788d46eae608128ff745d6f20b1bda84fd7fa8c1da3bbb69a22e6c7&",
-        ("Stainless Steel", "Plastic", "Fork"): "https://cdn.discordapp.com/attachments/1170248640145670164/1170251199279288360/images.png?ex=65585c5c&is=6545e75c&hm=74c0d129252bafd4bbd5a34cf4e422ff59049eb591bd51c4066a7316ea21167f&",
-        ("Stainless Steel", "Plastic", "Knife"): "https://cdn.discordapp.com/attachments/1170248640145670164/1170248899919872070/415IEhFdYtL.png?ex=65585a37&is=6545e537&hm=b8d57c9c5dad0ec72e213b2b9cd6e9bdd9c3eebc82da7607a822831597c53f6b&",
-        ("Stainless Steel", "Wood", "Spoon"): "https://media.discordapp.net/attachments/1170248640145670164/1170251681586491453/417djo180-L.png?ex=65585ccf&is=6545e7cf&hm=03d35e08dabb4d79194c45b656bf8a144c0708d268128742d0cd95367430339d&=&width=656&height=656",
-        ("Stainless Steel", "Wood", "Fork"): "https://cdn.discordapp.com/attachments/1170248640145670164/1170251578230452245/1957080.png?ex=65585cb6&is=6545e7b6&hm=eeee1586eb04ddc3d001e96d890640ef54c6254a4ebb3b80ab253833f7066e2d&",
-        ("Stainless Steel", "Wood", "Knife"): "https://cdn.discordapp.com/attachments/1170248640145670164/1170249065523597312/1823130.png?ex=65585a5f&is=6545e55f&hm=bb5b5aabe6d2dd0a6188860ac01adb8bebc5e24b79379c9dc9e2cbd8b3a79755&",
-        # Add more entries for other choices
-    }
 
-    # Check if the combination of choices exists in the dictionary
-    image_url = image_urls.get((metal, handle, cutlery_type))
+# Walk the store in id order one chunk at a time, so memory stays constant
+def iter_requirements(since_id: int, criteria: dict):
+    after_id = since_id
+    while True:
+        chunk = requirement_store.query(after_id=after_id, limit=EXPORT_CHUNK_SIZE, **criteria)
+        yield from chunk
+        if len(chunk) < EXPORT_CHUNK_SIZE:
+            return
+        after_id = chunk[-1]["id"]
+
+def export_ndjson_lines(since_id: int, criteria: dict):
+    for requirement in iter_requirements(since_id, criteria):
+        yield dumps(requirement) + b"\n"
+
+def export_csv_lines(since_id: int, criteria: dict):
+    columns = list(Requirement.__fields__)
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    for requirement in iter_requirements(since_id, criteria):
+        writer.writerow(requirement)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+def project_fields(fields: str) -> List[str]:
+    projection = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in projection if field not in Requirement.__fields__]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Unknown fields: {', '.join(unknown)}"
+        )
+    # The id is always returned, it is the pagination cursor
+    return ["id"] + [field for field in projection if field != "id"]
 
-    return image_url
+# If-None-Match holds "*" or a list of (possibly weak) ETags
+def etag_matches(etag: str, if_none_match: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in if_none_match.split(","))
 
-def reassign_ids():
-    for i, requirement in enumerate(requirements, start=1):
-        requirement['id'] = i
+def get_image_url(metal: str, handle: str, cutlery_type: str) -> str:
+    # Look the combination of choices up in the catalog's image table
+    return get_catalog().image_url(metal, handle, cutlery_type)
@@ -0,0 +1,26 @@
+import os
+
+import uvicorn
+
+# Server entry point. It deliberately does not import main: with several
+# workers this process only supervises them, and importing the app here
+# would replay the requirement log, open the stores and build the outbox in
+# a process that never serves a request (with one worker, twice in the
+# same process).
+#
+# Multi-worker deployment. Every worker process imports main and opens the
+# stores itself; they stay consistent through the shared backend:
+#   - REQUIREMENT_STORE=sqlite USER_STORE=sqlite keeps all state in one
+#     SQLite file in WAL mode (SQLITE_PATH, default data/state.db), imported
+#     once from the JSON/log files on first start
+#   - the default file stores also work across processes (file locks, and
+#     each worker re-reads what the others appended)
+# The registration outbox is shared: any worker queues jobs, one runs them.
+# Start with e.g.  WORKERS=4 REQUIREMENT_STORE=sqlite USER_STORE=sqlite python serve.py
+if __name__ == "__main__":
+    uvicorn.run(
+        "main:app",
+        host=os.environ.get("HOST", "0.0.0.0"),
+        port=int(os.environ.get("PORT", "80")),
+        workers=int(os.environ.get("WORKERS", "1"))
+    )
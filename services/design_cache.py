@@ -0,0 +1,88 @@
+import asyncio
+import bisect
+import time
+
+from fastapi import HTTPException
+
+
+# Snapshot of the partner's design collection with a sorted index over
+# `desainname`, so the designs of one user are a bisect away
+class DesignSnapshot:
+    def __init__(self, designs: list):
+        designs = sorted(designs, key=lambda design: design["desainname"])
+        self.names = [design["desainname"] for design in designs]
+        self.designs = designs
+        self.fetched_at = time.monotonic()
+
+    def with_prefix(self, prefix: str) -> list:
+        start = bisect.bisect_left(self.names, prefix)
+        end = start
+        while end < len(self.names) and self.names[end].startswith(prefix):
+            end += 1
+        return self.designs[start:end]
+
+
+# TTL cache with stale-while-revalidate for the whole design collection.
+# Concurrent misses share one upstream fetch; a stale snapshot is served
+# while a single background refresh runs. Only a successful fetch is shared:
+# one rejected for its token (401/403) is retried by every waiter that came
+# with another token, with its own.
+class DesignCollectionCache:
+    def __init__(self, fetch, ttl: float = 30.0, stale_ttl: float = 300.0):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._snapshot = None
+        self._inflight = None
+        self._inflight_token = None
+        self._generation = 0
+
+    async def designs_with_prefix(self, prefix: str, token: str) -> list:
+        snapshot = self._snapshot
+        if snapshot is not None:
+            age = time.monotonic() - snapshot.fetched_at
+            if age < self.ttl:
+                return snapshot.with_prefix(prefix)
+            if age < self.ttl + self.stale_ttl:
+                # Serve the stale copy, refresh in the background
+                self._start_refresh(token)
+                return snapshot.with_prefix(prefix)
+        while True:
+            fetch = self._start_refresh(token)
+            fetch_token = self._inflight_token
+            try:
+                # Shielded so one cancelled caller doesn't cancel the shared fetch
+                snapshot = await asyncio.shield(fetch)
+            except HTTPException as exc:
+                if fetch_token == token or exc.status_code not in (401, 403):
+                    raise
+                continue
+            return snapshot.with_prefix(prefix)
+
+    # Start a fetch unless one is already running, and return it
+    def _start_refresh(self, token: str) -> asyncio.Task:
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._fetch(token, self._generation))
+            self._inflight_token = token
+            # Background refreshes may finish with nobody awaiting them
+            self._inflight.add_done_callback(lambda task: task.cancelled() or task.exception())
+        return self._inflight
+
+    async def _fetch(self, token: str, generation: int) -> DesignSnapshot:
+        try:
+            snapshot = DesignSnapshot(await self.fetch(token))
+            # Drop results that were fetched before an invalidation
+            if generation == self._generation:
+                self._snapshot = snapshot
+            return snapshot
+        finally:
+            if generation == self._generation:
+                self._inflight = None
+                self._inflight_token = None
+
+    # Forget the cached collection, e.g. after a new design was created
+    def invalidate(self):
+        self._generation += 1
+        self._snapshot = None
+        self._inflight = None
+        self._inflight_token = None
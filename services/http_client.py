@@ -0,0 +1,126 @@
+import asyncio
+import time
+
+import httpx
+from fastapi import HTTPException, status
+
+from services.metrics import span
+
+# Methods that are safe to send again after the request may have reached the server
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+# Every client created, so the app can close their pools on shutdown
+_clients = []
+
+
+# Raised instead of calling the partner while its circuit is open
+class CircuitOpenError(Exception):
+    pass
+
+
+# Async client for a partner API: one pooled keep-alive connection pool per
+# base url, a timeout on every request, bounded retries with exponential
+# backoff, and a circuit breaker that fails fast after repeated failures
+class PartnerClient:
+    def __init__(
+        self,
+        base_url: str,
+        timeout: float = 10.0,
+        retries: int = 2,
+        backoff: float = 0.2,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        max_connections: int = 50,
+        transport: httpx.AsyncBaseTransport = None
+    ):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_connections = max_connections
+        self.transport = transport
+        self._client = None
+        self._failures = 0
+        self._opened_at = None
+        _clients.append(self)
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+                transport=self.transport
+            )
+        return self._client
+
+    # Closed circuit lets everything through; once open, one trial request is
+    # allowed after `reset_timeout` seconds (half-open)
+    def _check_circuit(self):
+        if self._opened_at is None:
+            return
+        if time.monotonic() - self._opened_at < self.reset_timeout:
+            raise CircuitOpenError(f"Circuit open for {self.base_url}")
+        self._opened_at = time.monotonic()
+
+    def _record_success(self):
+        self._failures = 0
+        self._opened_at = None
+
+    def _record_failure(self):
+        self._failures += 1
+        if self._failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+
+    async def request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        self._check_circuit()
+        method = method.upper()
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            try:
+                with span(f"partner.{method} {path}"):
+                    response = await self._get_client().request(method, path, **kwargs)
+            except httpx.ConnectError:
+                # Nothing reached the partner, safe to retry any method
+                self._record_failure()
+                if last_attempt:
+                    raise
+            except httpx.TransportError:
+                self._record_failure()
+                if last_attempt or method not in IDEMPOTENT_METHODS:
+                    raise
+            else:
+                if response.status_code < 500:
+                    self._record_success()
+                    return response
+                self._record_failure()
+                if last_attempt or method not in IDEMPOTENT_METHODS:
+                    return response
+            await asyncio.sleep(self.backoff * (2 ** attempt))
+
+    async def get(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", path, **kwargs)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# Error to send our own caller when the partner could not be reached
+def partner_unavailable(exc: Exception) -> HTTPException:
+    if isinstance(exc, CircuitOpenError):
+        return HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Partner service is unavailable, try again later.")
+    if isinstance(exc, httpx.TimeoutException):
+        return HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="Partner service timed out.")
+    return HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Could not reach partner service.")
+
+
+async def close_all_clients():
+    for client in _clients:
+        await client.aclose()
@@ -0,0 +1,202 @@
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds, in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Opt-in sampling profiler: requests slower than this many milliseconds get
+# the stacks sampled from the event loop thread logged (0 disables it)
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_PROFILE_MS", "0"))
+PROFILE_SAMPLE_INTERVAL = float(os.environ.get("PROFILE_SAMPLE_INTERVAL_MS", "5")) / 1000
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    escaped = (f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for name, value in labels)
+    return "{" + ",".join(escaped) + "}"
+
+
+# Latency histogram keyed by label values. Observations only touch a few
+# counters under a lock, rendering does the cumulative sums.
+class Histogram:
+    def __init__(self, name: str, help: str, label_names: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += 1
+            series[2] += value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {labels: ([*counts], count, total) for labels, (counts, count, total) in self._series.items()}
+        for label_values, (counts, count, total) in sorted(snapshot.items()):
+            labels = tuple(zip(self.label_names, label_values))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, help: str, label_names: tuple = ()):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def add(self, amount: float, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(tuple(zip(self.label_names, label_values)))} {value}")
+        return lines
+
+
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency by route.", ("method", "route", "status"))
+REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being served.", ("method",))
+SPAN_LATENCY = Histogram("app_span_duration_seconds", "Time spent in instrumented hot-path operations.", ("span",))
+COMMIT_GROUP_SIZE = Histogram("storage_commit_group_size", "Writes merged into one group commit.", ("queue",), (1, 2, 4, 8, 16, 32, 64, 128, 256))
+
+_metrics = [REQUEST_LATENCY, REQUESTS_IN_FLIGHT, SPAN_LATENCY, COMMIT_GROUP_SIZE]
+
+
+# Prometheus text exposition of every registered metric
+def render_metrics() -> str:
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Time a block of code (sync, or around an await) as a named span
+@contextmanager
+def span(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        SPAN_LATENCY.observe(time.perf_counter() - start, name)
+
+
+# Samples the event loop thread's stack while some request has been running
+# longer than the threshold, and logs the hottest stacks of slow requests
+class SlowRequestProfiler:
+    def __init__(self, threshold: float, interval: float):
+        self.threshold = threshold
+        self.interval = interval
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def begin(self, key, description: str):
+        with self._lock:
+            self._active[key] = (time.perf_counter(), threading.get_ident(), description, Counter())
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sample, daemon=True, name="slow-request-profiler")
+                self._thread.start()
+
+    def end(self, key):
+        with self._lock:
+            started, _, description, stacks = self._active.pop(key)
+        duration = time.perf_counter() - started
+        if duration >= self.threshold and stacks:
+            top = "\n".join(f"{count:>5} samples\n{stack}" for stack, count in stacks.most_common(5))
+            logger.warning("Slow request %s took %.1f ms, hottest stacks:\n%s", description, duration * 1000, top)
+
+    def _sample(self):
+        while True:
+            time.sleep(self.interval)
+            now = time.perf_counter()
+            with self._lock:
+                slow = [entry for entry in self._active.values() if now - entry[0] >= self.threshold]
+            if not slow:
+                continue
+            frames = sys._current_frames()
+            for _, thread_id, _, stacks in slow:
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    stacks["".join(traceback.format_stack(frame, limit=12))] += 1
+
+
+profiler = SlowRequestProfiler(SLOW_REQUEST_MS / 1000, PROFILE_SAMPLE_INTERVAL) if SLOW_REQUEST_MS > 0 else None
+
+
+# Path template of the route that handled the request. Newer FastAPI keeps
+# included routers un-flattened, so the route in the scope only carries the
+# path relative to its router's prefix; the full template is on the
+# effective route context.
+def _route_label(scope) -> str:
+    context = scope.get("fastapi", {}).get("effective_route_context")
+    if context is not None:
+        return context.path
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+# Pure ASGI middleware (no per-request task or body buffering): records the
+# latency histogram per matched route template ("/requirements/{id}", not
+# the raw path) and the number of requests in flight
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        # The route is only known once routing is done, so requests in flight
+        # are counted per method; raw paths would make unbounded labels
+        REQUESTS_IN_FLIGHT.add(1, method)
+        if profiler is not None:
+            profiler.begin(id(scope), f"{method} {scope['path']}")
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_FLIGHT.add(-1, method)
+            REQUEST_LATENCY.observe(time.perf_counter() - start, method, _route_label(scope), str(status_code))
+            if profiler is not None:
+                profiler.end(id(scope))
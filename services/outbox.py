@@ -0,0 +1,229 @@
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from storage.write_coordinator import file_lock
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks for jobs queued by other worker processes, and
+# between attempts to take over as the process running the jobs
+POLL_INTERVAL = 1.0
+
+
+# Raised by a job handler when retrying cannot help (e.g. the partner refused)
+class PermanentJobError(Exception):
+    pass
+
+
+# Durable job queue backed by an append-only file. A job is fsynced before
+# `add` returns, and only dropped from the file once its handler succeeded
+# (or gave up), so pending work survives a restart. Any worker process may
+# add jobs; the one holding the leader lock runs them, one at a time, with
+# exponential backoff between attempts. File access (flock, fsync) runs on
+# the outbox's own thread, never on the event loop.
+class Outbox:
+    def __init__(self, path: str, handler, on_failure=None, max_attempts: int = 8, backoff: float = 1.0):
+        self.path = path
+        self.handler = handler
+        self.on_failure = on_failure
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self._jobs = {}
+        # First line of the file as we last read it, and how far we read
+        self._first_line = b""
+        self._offset = 0
+        # Held by the file thread while it changes the jobs, and by pending()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="outbox")
+        self._leader_file = None
+        self._wakeup = None
+        self._worker = None
+
+        # Payloads may hold credentials, keep the file private
+        os.close(os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600))
+
+    # Apply the lines appended since we last read the file. Called with the
+    # file lock held, so a partial last line is a torn write (a crash in the
+    # middle of an append) and is cut off before anything is appended to it.
+    # A reset file starts with a fresh generation line, so a different first
+    # line means our offset points into a file we never read: start over.
+    def _catch_up(self):
+        with open(self.path, "rb") as outbox_file:
+            first_line = outbox_file.readline()
+            if not first_line.endswith(b"\n"):
+                first_line = b""
+            if first_line != self._first_line or os.fstat(outbox_file.fileno()).st_size < self._offset:
+                self._first_line = first_line
+                self._offset = 0
+                self._jobs = {}
+            outbox_file.seek(self._offset)
+            data = outbox_file.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            logger.warning("Dropping a torn write at the end of %s", self.path)
+            with open(self.path, "r+b") as outbox_file:
+                outbox_file.truncate(self._offset + end)
+                os.fsync(outbox_file.fileno())
+        for line in data[:end].splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                logger.warning("Skipping an unreadable line in %s", self.path)
+                continue
+            self._apply(entry)
+        self._offset += end
+
+    def _apply(self, entry: dict):
+        if entry["op"] == "add":
+            self._jobs[entry["job"]["id"]] = dict(entry["job"], attempts=0, run_at=0)
+        elif entry["op"] == "done":
+            self._jobs.pop(entry["id"], None)
+
+    # Called with the file lock held, right after _catch_up: the line lands
+    # at our offset, so it is applied here and never read back
+    def _append(self, entry: dict):
+        line = json.dumps(entry).encode("utf-8") + b"\n"
+        with open(self.path, "ab") as outbox_file:
+            outbox_file.write(line)
+            outbox_file.flush()
+            os.fsync(outbox_file.fileno())
+        self._apply(entry)
+        if self._offset == 0:
+            self._first_line = line
+        self._offset += len(line)
+
+    def _in_file_thread(self, function, *args):
+        return asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    def _refresh(self):
+        with self._lock, file_lock(self.path):
+            self._catch_up()
+
+    def _add(self, job: dict):
+        with self._lock, file_lock(self.path):
+            self._catch_up()
+            self._append({"op": "add", "job": job})
+
+    # Durably queue a job. With wake=False this process's worker is not
+    # nudged, for a caller that still has to commit what the job relies on
+    # (it then calls wake(), and the job is retried if it ran too early).
+    async def add(self, kind: str, payload: dict, wake: bool = True) -> str:
+        job = {"id": uuid.uuid4().hex, "kind": kind, "payload": payload}
+        await self._in_file_thread(self._add, job)
+        if wake:
+            self.wake()
+        return job["id"]
+
+    def wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _done(self, job: dict):
+        with self._lock, file_lock(self.path):
+            self._catch_up()
+            if any(id != job["id"] for id in self._jobs):
+                self._append({"op": "done", "id": job["id"]})
+            else:
+                # Nothing pending, so nothing worth keeping (payloads
+                # included). The file is swapped for one holding only a new
+                # generation line; truncating it in place would let another
+                # process resume at its old offset, in the middle of a line.
+                line = json.dumps({"op": "reset", "generation": uuid.uuid4().hex}).encode("utf-8") + b"\n"
+                tmp_path = self.path + ".tmp"
+                with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "wb") as tmp_file:
+                    tmp_file.write(line)
+                    tmp_file.flush()
+                    os.fsync(tmp_file.fileno())
+                os.replace(tmp_path, self.path)
+                self._jobs = {}
+                self._first_line = line
+                self._offset = len(line)
+
+    def pending(self) -> list:
+        with self._lock:
+            return list(self._jobs.values())
+
+    async def _run(self, job: dict):
+        try:
+            await self.handler(job["kind"], job["payload"])
+        except Exception as exc:
+            job["attempts"] += 1
+            permanent = isinstance(exc, PermanentJobError)
+            if permanent or job["attempts"] >= self.max_attempts:
+                logger.warning("Outbox job %s (%s) failed: %s", job["id"], job["kind"], exc)
+                if self.on_failure is not None:
+                    try:
+                        await self.on_failure(job["kind"], job["payload"])
+                    except Exception:
+                        logger.exception("Failure callback of outbox job %s (%s) failed", job["id"], job["kind"])
+                await self._in_file_thread(self._done, job)
+            else:
+                # Retry counters are kept in memory only; after a restart
+                # the job simply starts its backoff over
+                job["run_at"] = time.monotonic() + self.backoff * (2 ** (job["attempts"] - 1))
+        else:
+            await self._in_file_thread(self._done, job)
+
+    # Only one process runs the jobs: whoever holds the leader lock
+    def _try_lead(self) -> bool:
+        leader_file = open(self.path + ".leader", "a")
+        try:
+            fcntl.flock(leader_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            leader_file.close()
+            return False
+        self._leader_file = leader_file
+        return True
+
+    async def _work(self):
+        while not self._try_lead():
+            await asyncio.sleep(POLL_INTERVAL)
+
+        while True:
+            self._wakeup.clear()
+            try:
+                await self._in_file_thread(self._refresh)
+                now = time.monotonic()
+                due = [job for job in self.pending() if job["run_at"] <= now]
+                for job in due:
+                    await self._run(job)
+            except Exception:
+                # This is the only worker, it must outlive any one failure
+                logger.exception("Outbox worker error on %s", self.path)
+                await asyncio.sleep(POLL_INTERVAL)
+                continue
+            if due:
+                continue
+
+            # Sleep until the next retry is due, a job is added here, or it
+            # is time to look for jobs added by other processes
+            next_run = min((job["run_at"] for job in self.pending()), default=now + POLL_INTERVAL)
+            timeout = min(max(next_run - time.monotonic(), 0), POLL_INTERVAL)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._worker is None:
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.ensure_future(self._work())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        if self._leader_file is not None:
+            self._leader_file.close()
+            self._leader_file = None
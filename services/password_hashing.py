@@ -0,0 +1,26 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from passlib.hash import bcrypt
+
+from services.metrics import span
+
+# Number of bcrypt operations allowed to run at the same time
+BCRYPT_WORKERS = int(os.environ.get("BCRYPT_WORKERS", "4"))
+
+# bcrypt releases the GIL, so a thread pool keeps it off the event loop
+# while still bounding how many CPU cores a login storm can take
+_executor = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+
+
+async def hash_password(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    with span("bcrypt.hash"):
+        return await loop.run_in_executor(_executor, bcrypt.hash, password)
+
+
+async def verify_password(password: str, password_hash: str) -> bool:
+    loop = asyncio.get_running_loop()
+    with span("bcrypt.verify"):
+        return await loop.run_in_executor(_executor, bcrypt.verify, password, password_hash)
@@ -0,0 +1,44 @@
+import threading
+import time
+from collections import deque
+
+
+# Sliding-window limiter: at most `limit` hits per key within `window` seconds
+class RateLimiter:
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+        self._hits = {}
+        self._lock = threading.Lock()
+
+    def _recent(self, key: str, now: float):
+        hits = self._hits.get(key)
+        if hits is not None:
+            while hits and now - hits[0] >= self.window:
+                hits.popleft()
+        return hits
+
+    # Record a hit for `key`, unless it has used up its hits within the
+    # window; check and record happen under one lock, so concurrent callers
+    # can't all get past the check
+    def allow(self, key: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            hits = self._recent(key, now)
+            if hits is None:
+                hits = self._hits[key] = deque()
+            if len(hits) >= self.limit:
+                return False
+            hits.append(now)
+            if len(self._hits) > 10000:
+                self._prune(now)
+            return True
+
+    def reset(self, key: str):
+        with self._lock:
+            self._hits.pop(key, None)
+
+    # Forget keys without recent hits so memory stays bounded
+    def _prune(self, now: float):
+        for key in [key for key, hits in self._hits.items() if not hits or now - hits[-1] >= self.window]:
+            del self._hits[key]
@@ -0,0 +1,91 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from models.requirements import Cutlery_Type, Handle, Metal
+
+CATALOG_PATH = "data/requirement.json"
+# Minimum number of seconds between two checks of the file's modification time
+RELOAD_CHECK_INTERVAL = 1.0
+
+
+# Immutable snapshot of the catalog sections of requirement.json
+class Catalog:
+    def __init__(self, data: dict):
+        self.metals = tuple(data.get("metals", []))
+        self.handles = tuple(data.get("handles", []))
+        self.cutlery_types = tuple(data.get("cutlery_types", []))
+        self.names = {
+            "metal": frozenset(metal["name"] for metal in self.metals),
+            "handle": frozenset(handle["name"] for handle in self.handles),
+            "cutlery_type": frozenset(cutlery_type["name"] for cutlery_type in self.cutlery_types),
+        }
+        # (metal, handle, cutlery_type) -> image url
+        self.image_urls = {
+            (image["metal"], image["handle"], image["cutlery_type"]): image["image_url"]
+            for image in data.get("images", [])
+        }
+
+        # The /choices response bodies, validated and serialized once per
+        # snapshot; a reload builds a new snapshot and so new bodies and ETags
+        sections = {
+            "metals": [Metal(**metal).dict() for metal in self.metals],
+            "handles": [Handle(**handle).dict() for handle in self.handles],
+            "types": [Cutlery_Type(**cutlery_type).dict() for cutlery_type in self.cutlery_types],
+        }
+        sections["all"] = dict(sections)
+        self.responses = {name: _serialized(section) for name, section in sections.items()}
+
+    # Every invalid choice of a requirement, not just the first one
+    def choice_errors(self, requirement_data) -> list:
+        errors = []
+        for field_name, names in self.names.items():
+            if getattr(requirement_data, field_name) not in names:
+                errors.append(f"{field_name} not found in the list")
+        return errors
+
+    def image_url(self, metal: str, handle: str, cutlery_type: str):
+        return self.image_urls.get((metal, handle, cutlery_type))
+
+
+# (body, ETag) for a JSON document; the ETag is a hash of the exact bytes
+def _serialized(document) -> tuple:
+    body = json.dumps(document, separators=(",", ":")).encode("utf-8")
+    return body, '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+_catalog = None
+_catalog_mtime = None
+_last_check = 0.0
+_reload_lock = threading.Lock()
+
+
+def _load(path: str):
+    global _catalog, _catalog_mtime
+    mtime = os.stat(path).st_mtime_ns
+    with open(path, "r") as json_file:
+        catalog = Catalog(json.load(json_file))
+    # Swap the whole snapshot at once, readers never see a half-loaded catalog
+    _catalog, _catalog_mtime = catalog, mtime
+
+
+# Current catalog, reloaded when requirement.json has been modified
+def get_catalog(path: str = CATALOG_PATH) -> Catalog:
+    global _last_check
+    now = time.monotonic()
+    if _catalog is not None and now - _last_check < RELOAD_CHECK_INTERVAL:
+        return _catalog
+
+    with _reload_lock:
+        _last_check = now
+        try:
+            changed = _catalog is None or os.stat(path).st_mtime_ns != _catalog_mtime
+            if changed:
+                _load(path)
+        except (OSError, ValueError, KeyError):
+            # Keep serving the last good catalog while the file is being rewritten
+            if _catalog is None:
+                raise
+    return _catalog
@@ -0,0 +1,49 @@
+from itertools import combinations
+
+# Fields the order volume can be broken down by
+STATS_FIELDS = ("username", "metal", "handle", "cutlery_type")
+
+
+# Count and total quantity of requirements, kept up to date one write at a
+# time for every combination of STATS_FIELDS (16 tables, keyed by the values
+# of the fields in that combination). A lookup with every grouped field
+# fixed is a single dict access, whatever the number of requirements; a
+# breakdown only walks the groups of its combination.
+class RequirementStats:
+    def __init__(self):
+        self._tables = {
+            fields: {}
+            for size in range(len(STATS_FIELDS) + 1)
+            for fields in combinations(STATS_FIELDS, size)
+        }
+
+    # Count a record in (sign=1) or out (sign=-1) of every table
+    def add(self, record: dict, sign: int = 1):
+        quantity = record["quantity"] * sign
+        for fields, table in self._tables.items():
+            key = tuple(record[field] for field in fields)
+            cell = table.get(key)
+            if cell is None:
+                cell = table[key] = [0, 0]
+            cell[0] += sign
+            cell[1] += quantity
+            if cell[0] == 0:
+                del table[key]
+
+    # One row per group of `group_by`, restricted to the filtered values;
+    # filtered fields are part of the key, so they come back in every row
+    def query(self, filters: dict, group_by: list) -> list:
+        fields = tuple(field for field in STATS_FIELDS if field in group_by or filters.get(field) is not None)
+        table = self._tables[fields]
+        fixed = [(i, filters[field]) for i, field in enumerate(fields) if filters.get(field) is not None]
+
+        if len(fixed) == len(fields):
+            key = tuple(value for _, value in fixed)
+            count, total_quantity = table.get(key, (0, 0))
+            return [dict(zip(fields, key), count=count, total_quantity=total_quantity)]
+
+        rows = []
+        for key in sorted(key for key in table if all(key[i] == value for i, value in fixed)):
+            count, total_quantity = table[key]
+            rows.append(dict(zip(fields, key), count=count, total_quantity=total_quantity))
+        return rows
@@ -0,0 +1,393 @@
+import bisect
+import heapq
+import json
+import os
+import threading
+from itertools import islice
+
+from storage.requirement_stats import RequirementStats
+from storage.write_coordinator import CommitQueue, file_lock
+
+# Paths of the legacy JSON file and the append-only requirement log
+LEGACY_JSON_PATH = "data/requirement.json"
+LOG_PATH = os.environ.get("REQUIREMENT_LOG_PATH", "data/requirements.log")
+# Compact the log once it holds this many times more entries than live records
+COMPACT_RATIO = 4
+# Fields with an equality index (value -> sorted ids)
+INDEXED_FIELDS = ("username", "metal", "handle", "cutlery_type")
+
+
+# Raised when an update targets a requirement that was deleted meanwhile
+class RequirementNotFound(Exception):
+    pass
+
+
+# Interface the route handlers talk to, so the storage engine can be swapped.
+# Reads are synchronous; writes are awaited since they go through the
+# single-writer commit queue. Records inserted with "id": None get the next
+# id from the store's allocator when they are committed.
+class RequirementStore:
+    def all(self) -> list:
+        raise NotImplementedError
+
+    def get(self, id: int):
+        raise NotImplementedError
+
+    def query(self, filters: dict = None, after_id: int = 0, limit: int = None,
+              min_quantity: int = None, max_quantity: int = None) -> list:
+        raise NotImplementedError
+
+    # Count and total quantity per group, see RequirementStats.query
+    def stats(self, filters: dict, group_by: list) -> list:
+        raise NotImplementedError
+
+    async def insert(self, record: dict) -> dict:
+        raise NotImplementedError
+
+    async def update(self, record: dict) -> dict:
+        raise NotImplementedError
+
+    async def delete(self, id: int) -> None:
+        raise NotImplementedError
+
+    async def write_batch(self, records: list, deleted_ids: list) -> list:
+        raise NotImplementedError
+
+    def replace_all(self, records: list) -> None:
+        raise NotImplementedError
+
+
+# Append-only log store: every commit is a single JSON line holding a list of
+# operations, fsynced before the writer is answered. A torn last line (crash
+# in the middle of a write) is cut off, so a commit is either fully applied
+# or not at all. Deletes only append a tombstone; the log is compacted in a
+# background thread once it grows well past the live set.
+#
+# Several processes may share the log: appends and compaction hold an
+# exclusive file lock, and every read first applies whatever other
+# processes appended since (or replays the log if it was compacted).
+class LogRequirementStore(RequirementStore):
+    def __init__(self, path: str = LOG_PATH, legacy_path: str = LEGACY_JSON_PATH):
+        self.path = path
+        # Guards the in-memory table, the log itself is guarded by file_lock
+        self._lock = threading.Lock()
+        self._inode = None
+        self._offset = 0
+        self._reset()
+        self._compactor = None
+        self._writes = CommitQueue(self.commit_many, "requirements")
+
+        with file_lock(self.path):
+            if not os.path.exists(self.path):
+                self._write_snapshot(self.path, import_legacy_json(legacy_path), 1)
+            with self._lock:
+                self._catch_up(truncate_torn=True)
+
+    def _reset(self):
+        self._records = {}
+        # Sorted list of live ids, used for keyset pagination
+        self._ids = []
+        # Secondary indexes: field -> value -> sorted ids of matching requirements
+        self._indexes = {field: {} for field in INDEXED_FIELDS}
+        # Range index on quantity: quantity -> sorted ids, plus the sorted
+        # distinct quantities to find the ones inside a range
+        self._quantity_index = {}
+        self._quantities = []
+        # Order volume aggregates, rebuilt along with the table on replay
+        self._stats = RequirementStats()
+        # Monotonic id allocator, persisted in the log so ids are never reused
+        self._next_id = 1
+        self._entries = 0
+
+    # Apply the entries appended to the log since we last read it. Called
+    # with self._lock held; a compacted log (new inode) is replayed in full.
+    def _catch_up(self, truncate_torn: bool = False):
+        with open(self.path, "rb") as log_file:
+            stat = os.fstat(log_file.fileno())
+            if stat.st_ino != self._inode:
+                self._reset()
+                self._inode = stat.st_ino
+                self._offset = 0
+            if stat.st_size == self._offset:
+                return
+            log_file.seek(self._offset)
+            data = log_file.read()
+
+        # Only complete lines are applied; a partial one is either being
+        # written by another process or, under the file lock, a torn write
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            self._apply_entry(json.loads(line))
+        self._offset += end
+        if truncate_torn and end < len(data):
+            with open(self.path, "r+b") as log_file:
+                log_file.truncate(self._offset)
+
+    def _apply_entry(self, entry: dict):
+        for op in entry["ops"]:
+            self._apply(op)
+        self._next_id = max(self._next_id, entry.get("next_id", 1))
+        self._entries += 1
+
+    # Apply one operation to the table, keeping the indexes in step
+    def _apply(self, op: dict):
+        if op["op"] == "put":
+            record = op["record"]
+            old = self._records.get(record["id"])
+            if old is None:
+                _insort(self._ids, record["id"])
+            else:
+                self._stats.add(old, -1)
+            self._stats.add(record)
+            for field, index in self._indexes.items():
+                if old is not None and old[field] == record[field]:
+                    continue
+                if old is not None:
+                    _remove_id(index, old[field], old["id"])
+                _insort(index.setdefault(record[field], []), record["id"])
+            if old is None or old["quantity"] != record["quantity"]:
+                if old is not None:
+                    self._unindex_quantity(old)
+                self._index_quantity(record)
+            self._records[record["id"]] = record
+            self._next_id = max(self._next_id, record["id"] + 1)
+        elif op["op"] == "del":
+            old = self._records.pop(op["id"], None)
+            if old is None:
+                return
+            _remove_sorted(self._ids, old["id"])
+            for field, index in self._indexes.items():
+                _remove_id(index, old[field], old["id"])
+            self._unindex_quantity(old)
+            self._stats.add(old, -1)
+
+    def _index_quantity(self, record: dict):
+        ids = self._quantity_index.get(record["quantity"])
+        if ids is None:
+            ids = self._quantity_index[record["quantity"]] = []
+            bisect.insort(self._quantities, record["quantity"])
+        _insort(ids, record["id"])
+
+    def _unindex_quantity(self, record: dict):
+        _remove_id(self._quantity_index, record["quantity"], record["id"])
+        if record["quantity"] not in self._quantity_index:
+            _remove_sorted(self._quantities, record["quantity"])
+
+    # Group commit: write every batch as its own log entry, then fsync once.
+    # Runs on the commit queue's single writer thread. Returns, per batch,
+    # the committed records or the exception that rejected the batch.
+    def commit_many(self, batches: list) -> list:
+        with file_lock(self.path):
+            with self._lock:
+                self._catch_up(truncate_torn=True)
+                next_id = self._next_id
+                lines = []
+                results = []
+                for ops in batches:
+                    missing = [op["record"]["id"] for op in ops if op.get("existing") and op["record"]["id"] not in self._records]
+                    if missing:
+                        results.append(RequirementNotFound(missing[0]))
+                        continue
+                    entry_ops = []
+                    for op in ops:
+                        if op["op"] == "put":
+                            record = op["record"]
+                            if record.get("id") is None:
+                                record = dict(record, id=next_id)
+                                next_id += 1
+                            op = {"op": "put", "record": record}
+                        entry_ops.append(op)
+                    lines.append(json.dumps({"ops": entry_ops, "next_id": next_id}).encode("utf-8") + b"\n")
+                    results.append([op["record"] for op in entry_ops if op["op"] == "put"])
+
+            if lines:
+                with open(self.path, "ab") as log_file:
+                    log_file.write(b"".join(lines))
+                    log_file.flush()
+                    os.fsync(log_file.fileno())
+
+            with self._lock:
+                self._catch_up()
+                if self._entries > COMPACT_RATIO * max(len(self._records), 1):
+                    self._schedule_compaction()
+        return results
+
+    # Write a log holding one put per live record plus the id counter
+    @staticmethod
+    def _write_snapshot(path: str, records: list, next_id: int):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as tmp_file:
+            entry = {"ops": [{"op": "put", "record": r} for r in records], "next_id": next_id}
+            tmp_file.write(json.dumps(entry).encode("utf-8") + b"\n")
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        os.replace(tmp_path, path)
+
+    def _schedule_compaction(self):
+        if self._compactor is None or not self._compactor.is_alive():
+            self._compactor = threading.Thread(target=self.compact, daemon=True)
+            self._compactor.start()
+
+    # Rewrite the log as a single snapshot. Holds the file lock so no other
+    # process appends meanwhile; reads keep being served from memory.
+    def compact(self):
+        with file_lock(self.path):
+            with self._lock:
+                self._catch_up(truncate_torn=True)
+                records = [self._records[id] for id in self._ids]
+                next_id = self._next_id
+            self._write_snapshot(self.path, records, next_id)
+            with self._lock:
+                stat = os.stat(self.path)
+                self._inode = stat.st_ino
+                self._offset = stat.st_size
+                self._entries = 1
+
+    def all(self) -> list:
+        with self._lock:
+            self._catch_up()
+            return [self._records[id] for id in self._ids]
+
+    def get(self, id: int):
+        with self._lock:
+            self._catch_up()
+            return self._records.get(id)
+
+    # Id the next inserted requirement will get
+    def next_id(self) -> int:
+        with self._lock:
+            self._catch_up()
+            return self._next_id
+
+    # Requirements matching every equality filter, in id order after `after_id`.
+    # Candidates come from the most selective index: one of the equality
+    # indexes, or the quantity range (the id lists of every quantity inside
+    # it, merged back into id order). The other filters are checked on those
+    # candidates only, and a page stops as soon as it is full.
+    def query(self, filters: dict = None, after_id: int = 0, limit: int = None,
+              min_quantity: int = None, max_quantity: int = None) -> list:
+        filters = {field: value for field, value in (filters or {}).items() if value is not None}
+        with self._lock:
+            self._catch_up()
+            sources = [self._ids]
+            size = len(self._ids)
+            for field, value in filters.items():
+                ids = self._indexes[field].get(value, [])
+                if len(ids) < size:
+                    sources, size = [ids], len(ids)
+            if min_quantity is not None or max_quantity is not None:
+                low = 0 if min_quantity is None else bisect.bisect_left(self._quantities, min_quantity)
+                high = len(self._quantities) if max_quantity is None else bisect.bisect_right(self._quantities, max_quantity)
+                in_range = [self._quantity_index[quantity] for quantity in self._quantities[low:high]]
+                in_range_size = sum(len(ids) for ids in in_range)
+                if in_range_size < size:
+                    sources, size = in_range, in_range_size
+
+            after_id = after_id or 0
+            candidates = heapq.merge(*[islice(ids, bisect.bisect_right(ids, after_id), None) for ids in sources])
+
+            results = []
+            for id in candidates:
+                record = self._records[id]
+                if any(record[field] != value for field, value in filters.items()):
+                    continue
+                if min_quantity is not None and record["quantity"] < min_quantity:
+                    continue
+                if max_quantity is not None and record["quantity"] > max_quantity:
+                    continue
+                results.append(record)
+                if limit is not None and len(results) >= limit:
+                    break
+            return results
+
+    # Served from the aggregates kept by _apply, no scan of the records
+    def stats(self, filters: dict, group_by: list) -> list:
+        with self._lock:
+            self._catch_up()
+            return self._stats.query(filters, group_by)
+
+    async def insert(self, record: dict) -> dict:
+        created = await self._writes.submit([{"op": "put", "record": record}])
+        return created[0]
+
+    # Fails with RequirementNotFound if the record was deleted meanwhile
+    async def update(self, record: dict) -> dict:
+        updated = await self._writes.submit([{"op": "put", "record": record, "existing": True}])
+        return updated[0]
+
+    # Append a tombstone; the record is dropped from the log at compaction
+    async def delete(self, id: int) -> None:
+        await self._writes.submit([{"op": "del", "id": id}])
+
+    # Put and delete many requirements with a single atomic log entry
+    async def write_batch(self, records: list, deleted_ids: list) -> list:
+        ops = [{"op": "put", "record": r, "existing": r.get("id") is not None} for r in records]
+        ops += [{"op": "del", "id": id} for id in deleted_ids]
+        if not ops:
+            return []
+        return await self._writes.submit(ops)
+
+    # Swap the whole table in one commit (synchronous, for the importer)
+    def replace_all(self, records: list) -> None:
+        ops = [{"op": "del", "id": id} for id in [r["id"] for r in self.all()]]
+        ops += [{"op": "put", "record": r} for r in records]
+        result = self.commit_many([ops])[0]
+        if isinstance(result, Exception):
+            raise result
+
+
+# Sorted-list helpers for the indexes; new ids are the largest so far, so
+# inserting is an append in the common case
+def _insort(ids: list, id: int):
+    if not ids or ids[-1] < id:
+        ids.append(id)
+    else:
+        bisect.insort(ids, id)
+
+
+def _remove_sorted(ids: list, id: int):
+    i = bisect.bisect_left(ids, id)
+    if i < len(ids) and ids[i] == id:
+        del ids[i]
+
+
+def _remove_id(index: dict, value, id: int):
+    ids = index.get(value)
+    if ids is not None:
+        _remove_sorted(ids, id)
+        if not ids:
+            del index[value]
+
+
+# One-shot import of the requirements held in the old requirement.json.
+# The handlers used to load the "requirement" key but wrote back to either
+# "requirement" or "requirements", so the file can hold two diverging copies.
+# "requirement" is what the service actually served after its last restart,
+# so it wins; "requirements" is only used when the other key is missing.
+def import_legacy_json(path: str = LEGACY_JSON_PATH) -> list:
+    if not os.path.exists(path):
+        return []
+    with open(path, "r") as json_file:
+        legacy = json.load(json_file)
+    if "requirement" in legacy:
+        return legacy["requirement"]
+    return legacy.get("requirements", [])
+
+
+# Pick the storage engine, configurable through REQUIREMENT_STORE
+def open_requirement_store() -> RequirementStore:
+    backend = os.environ.get("REQUIREMENT_STORE", "log")
+    if backend == "log":
+        return LogRequirementStore()
+    if backend == "sqlite":
+        from storage.sqlite_backend import SQLiteRequirementStore
+        return SQLiteRequirementStore()
+    raise ValueError(f"Unknown requirement store backend: {backend}")
+
+
+if __name__ == "__main__":
+    # Re-run the import from requirement.json, replacing the current log
+    store = LogRequirementStore()
+    store.replace_all(import_legacy_json())
+    store.compact()
+    print(f"Imported {len(store.all())} requirements into {store.path}")
@@ -0,0 +1,406 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+from models.users import UserJSON
+from storage.cache import LRUCache
+from storage.requirement_stats import STATS_FIELDS
+from storage.requirement_store import INDEXED_FIELDS, RequirementNotFound, RequirementStore, import_legacy_json
+from storage.user_store import UsernameTaken
+from storage.write_coordinator import CommitQueue
+
+logger = logging.getLogger(__name__)
+
+# Shared database used when REQUIREMENT_STORE / USER_STORE are set to "sqlite"
+SQLITE_PATH = os.environ.get("SQLITE_PATH", "data/state.db")
+
+REQUIREMENT_COLUMNS = ("id", "username", "metal", "handle", "cutlery_type", "quantity", "image_url")
+USER_COLUMNS = ("id", "username", "password_hash", "is_admin", "integrasi_token", "integration_status")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS requirements (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    metal TEXT NOT NULL,
+    handle TEXT NOT NULL,
+    cutlery_type TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    image_url TEXT
+);
+CREATE INDEX IF NOT EXISTS requirements_username ON requirements (username, id);
+CREATE INDEX IF NOT EXISTS requirements_metal ON requirements (metal, id);
+CREATE INDEX IF NOT EXISTS requirements_handle ON requirements (handle, id);
+CREATE INDEX IF NOT EXISTS requirements_cutlery_type ON requirements (cutlery_type, id);
+CREATE INDEX IF NOT EXISTS requirements_quantity ON requirements (quantity, id);
+CREATE TABLE IF NOT EXISTS requirement_totals (
+    username TEXT NOT NULL,
+    metal TEXT NOT NULL,
+    handle TEXT NOT NULL,
+    cutlery_type TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    total_quantity INTEGER NOT NULL,
+    PRIMARY KEY (username, metal, handle, cutlery_type)
+);
+CREATE TRIGGER IF NOT EXISTS requirement_totals_insert AFTER INSERT ON requirements BEGIN
+    INSERT INTO requirement_totals VALUES (NEW.username, NEW.metal, NEW.handle, NEW.cutlery_type, 1, NEW.quantity)
+    ON CONFLICT (username, metal, handle, cutlery_type) DO UPDATE
+    SET count = count + 1, total_quantity = total_quantity + excluded.total_quantity;
+END;
+CREATE TRIGGER IF NOT EXISTS requirement_totals_delete AFTER DELETE ON requirements BEGIN
+    UPDATE requirement_totals SET count = count - 1, total_quantity = total_quantity - OLD.quantity
+    WHERE username = OLD.username AND metal = OLD.metal AND handle = OLD.handle AND cutlery_type = OLD.cutlery_type;
+    DELETE FROM requirement_totals WHERE count = 0
+    AND username = OLD.username AND metal = OLD.metal AND handle = OLD.handle AND cutlery_type = OLD.cutlery_type;
+END;
+CREATE TRIGGER IF NOT EXISTS requirement_totals_update AFTER UPDATE ON requirements BEGIN
+    UPDATE requirement_totals SET count = count - 1, total_quantity = total_quantity - OLD.quantity
+    WHERE username = OLD.username AND metal = OLD.metal AND handle = OLD.handle AND cutlery_type = OLD.cutlery_type;
+    DELETE FROM requirement_totals WHERE count = 0
+    AND username = OLD.username AND metal = OLD.metal AND handle = OLD.handle AND cutlery_type = OLD.cutlery_type;
+    INSERT INTO requirement_totals VALUES (NEW.username, NEW.metal, NEW.handle, NEW.cutlery_type, 1, NEW.quantity)
+    ON CONFLICT (username, metal, handle, cutlery_type) DO UPDATE
+    SET count = count + 1, total_quantity = total_quantity + excluded.total_quantity;
+END;
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL UNIQUE,
+    password_hash TEXT NOT NULL,
+    is_admin INTEGER NOT NULL,
+    integrasi_token TEXT,
+    integration_status TEXT NOT NULL DEFAULT 'active'
+);
+CREATE TABLE IF NOT EXISTS imports (
+    name TEXT PRIMARY KEY
+);
+"""
+
+
+# One connection per thread to a WAL-mode database, so readers in every
+# worker process run alongside the single writer without blocking
+class SQLiteDatabase:
+    def __init__(self, path: str = SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            # INSERT OR REPLACE only fires the delete triggers with this on
+            conn.execute("PRAGMA recursive_triggers=ON")
+            self._local.conn = conn
+        return conn
+
+    # Changes whenever another connection commits to the database; used as
+    # the change notification for in-process caches
+    def data_version(self) -> int:
+        return self.connection().execute("PRAGMA data_version").fetchone()[0]
+
+    # Run `load` once per database (across every process) to seed a table
+    def import_once(self, name: str, load):
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM imports WHERE name = ?", (name,)).fetchone() is None:
+                load(conn)
+                conn.execute("INSERT INTO imports (name) VALUES (?)", (name,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+_databases = {}
+_databases_lock = threading.Lock()
+
+
+def open_database(path: str = SQLITE_PATH) -> SQLiteDatabase:
+    with _databases_lock:
+        if path not in _databases:
+            _databases[path] = SQLiteDatabase(path)
+        return _databases[path]
+
+
+# Requirements in SQLite; the per-field indexes serve lookups and keyset
+# pages, AUTOINCREMENT keeps ids monotonic, and every group commit is one
+# transaction. Triggers keep requirement_totals (count and quantity per
+# username, metal, handle and cutlery type) in step with every write, from
+# any process, inside the writing transaction.
+class SQLiteRequirementStore(RequirementStore):
+    def __init__(self, database: SQLiteDatabase = None):
+        self.db = database or open_database()
+        self._writes = CommitQueue(self.commit_many, "requirements")
+        self.db.import_once("requirements", self._import)
+        self.db.import_once("requirement_totals", self._import_totals)
+
+    # Seed from the append-only log if there is one, else from requirement.json.
+    # The id counter comes along, so ids deleted before the switch are not
+    # handed out again.
+    @staticmethod
+    def _import(conn):
+        from storage.requirement_store import LOG_PATH, LogRequirementStore
+        if os.path.exists(LOG_PATH):
+            log_store = LogRequirementStore(LOG_PATH)
+            records, next_id = log_store.all(), log_store.next_id()
+        else:
+            records = import_legacy_json()
+            next_id = max((record["id"] for record in records), default=0) + 1
+        conn.executemany(
+            f"INSERT INTO requirements ({', '.join(REQUIREMENT_COLUMNS)}) VALUES ({', '.join('?' * len(REQUIREMENT_COLUMNS))})",
+            [tuple(record.get(column) for column in REQUIREMENT_COLUMNS) for record in records]
+        )
+        conn.execute("DELETE FROM sqlite_sequence WHERE name = 'requirements'")
+        conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('requirements', ?)", (next_id - 1,))
+
+    # Totals for rows written before the triggers existed
+    @staticmethod
+    def _import_totals(conn):
+        conn.execute("DELETE FROM requirement_totals")
+        conn.execute(
+            "INSERT INTO requirement_totals SELECT username, metal, handle, cutlery_type, COUNT(*), SUM(quantity) "
+            "FROM requirements GROUP BY username, metal, handle, cutlery_type"
+        )
+
+    def _select(self, where: str = "", params: tuple = (), limit: int = None) -> list:
+        sql = f"SELECT {', '.join(REQUIREMENT_COLUMNS)} FROM requirements {where} ORDER BY id"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return [dict(row) for row in self.db.connection().execute(sql, params)]
+
+    def all(self) -> list:
+        return self._select()
+
+    def get(self, id: int):
+        rows = self._select("WHERE id = ?", (id,))
+        return rows[0] if rows else None
+
+    def query(self, filters: dict = None, after_id: int = 0, limit: int = None,
+              min_quantity: int = None, max_quantity: int = None) -> list:
+        conditions = ["id > ?"]
+        params = [after_id or 0]
+        for field, value in (filters or {}).items():
+            if value is not None and field in INDEXED_FIELDS:
+                conditions.append(f"{field} = ?")
+                params.append(value)
+        if min_quantity is not None:
+            conditions.append("quantity >= ?")
+            params.append(min_quantity)
+        if max_quantity is not None:
+            conditions.append("quantity <= ?")
+            params.append(max_quantity)
+        return self._select("WHERE " + " AND ".join(conditions), tuple(params), limit)
+
+    # Sums over requirement_totals, whose size depends on the number of
+    # users and catalog combinations, not on the number of requirements
+    def stats(self, filters: dict, group_by: list) -> list:
+        fields = [field for field in STATS_FIELDS if field in group_by or filters.get(field) is not None]
+        fixed = [field for field in fields if filters.get(field) is not None]
+        sql = "SUM(count) AS count, SUM(total_quantity) AS total_quantity FROM requirement_totals"
+        if fixed:
+            sql += " WHERE " + " AND ".join(f"{field} = ?" for field in fixed)
+        params = tuple(filters[field] for field in fixed)
+        conn = self.db.connection()
+
+        if len(fixed) == len(fields):
+            # Every grouped field is fixed: one row, zeros when nothing matches
+            row = conn.execute("SELECT " + sql, params).fetchone()
+            return [dict(zip(fields, params), count=row["count"] or 0, total_quantity=row["total_quantity"] or 0)]
+        columns = ", ".join(fields)
+        rows = conn.execute(f"SELECT {columns}, {sql} GROUP BY {columns} ORDER BY {columns}", params)
+        return [dict(row) for row in rows]
+
+    # Group commit: every batch in its own savepoint, all in one transaction
+    def commit_many(self, batches: list) -> list:
+        conn = self.db.connection()
+        results = []
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for ops in batches:
+                conn.execute("SAVEPOINT batch")
+                try:
+                    results.append(self._apply_batch(conn, ops))
+                    conn.execute("RELEASE batch")
+                except RequirementNotFound as exc:
+                    conn.execute("ROLLBACK TO batch")
+                    conn.execute("RELEASE batch")
+                    results.append(exc)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return results
+
+    def _apply_batch(self, conn, ops: list) -> list:
+        records = []
+        for op in ops:
+            if op["op"] == "del":
+                conn.execute("DELETE FROM requirements WHERE id = ?", (op["id"],))
+                continue
+            record = op["record"]
+            values = tuple(record.get(column) for column in REQUIREMENT_COLUMNS[1:])
+            if record.get("id") is None:
+                cursor = conn.execute(
+                    f"INSERT INTO requirements ({', '.join(REQUIREMENT_COLUMNS[1:])}) VALUES ({', '.join('?' * (len(REQUIREMENT_COLUMNS) - 1))})",
+                    values
+                )
+                record = dict(record, id=cursor.lastrowid)
+            elif op.get("existing"):
+                cursor = conn.execute(
+                    f"UPDATE requirements SET {', '.join(column + ' = ?' for column in REQUIREMENT_COLUMNS[1:])} WHERE id = ?",
+                    values + (record["id"],)
+                )
+                if cursor.rowcount == 0:
+                    raise RequirementNotFound(record["id"])
+            else:
+                conn.execute(
+                    f"INSERT OR REPLACE INTO requirements ({', '.join(REQUIREMENT_COLUMNS)}) VALUES ({', '.join('?' * len(REQUIREMENT_COLUMNS))})",
+                    (record["id"],) + values
+                )
+            records.append(record)
+        return records
+
+    async def insert(self, record: dict) -> dict:
+        created = await self._writes.submit([{"op": "put", "record": record}])
+        return created[0]
+
+    async def update(self, record: dict) -> dict:
+        updated = await self._writes.submit([{"op": "put", "record": record, "existing": True}])
+        return updated[0]
+
+    async def delete(self, id: int) -> None:
+        await self._writes.submit([{"op": "del", "id": id}])
+
+    async def write_batch(self, records: list, deleted_ids: list) -> list:
+        ops = [{"op": "put", "record": r, "existing": r.get("id") is not None} for r in records]
+        ops += [{"op": "del", "id": id} for id in deleted_ids]
+        if not ops:
+            return []
+        return await self._writes.submit(ops)
+
+    def replace_all(self, records: list) -> None:
+        ops = [{"op": "del", "id": r["id"]} for r in self.all()] + [{"op": "put", "record": r} for r in records]
+        result = self.commit_many([ops])[0]
+        if isinstance(result, Exception):
+            raise result
+
+
+# Users in SQLite, same interface as UserRegistry. The cache of validated
+# models is dropped whenever PRAGMA data_version reports a commit from any
+# other connection, so every worker sees registrations and token updates.
+class SQLiteUserRegistry:
+    def __init__(self, database: SQLiteDatabase = None, cache_size: int = 1024):
+        self.db = database or open_database()
+        self._models = LRUCache(cache_size)
+        self._data_version = None
+        self._writes = CommitQueue(self.commit_many, "users")
+        self.db.import_once("users", self._import)
+
+    @staticmethod
+    def _import(conn):
+        from storage.user_store import USERS_PATH
+        if not os.path.exists(USERS_PATH):
+            return
+        with open(USERS_PATH, "r") as json_file:
+            users = json.load(json_file)
+        # users.json does not enforce unique usernames; keep the first
+        # account of each name (the one logins resolved to) and report the rest
+        seen = set()
+        unique_users = []
+        for u in sorted(users, key=lambda u: u["id"]):
+            if u["username"] in seen:
+                logger.warning("Not importing user %s: username %r is already taken", u["id"], u["username"])
+                continue
+            seen.add(u["username"])
+            unique_users.append(u)
+        conn.executemany(
+            f"INSERT INTO users ({', '.join(USER_COLUMNS)}) VALUES ({', '.join('?' * len(USER_COLUMNS))})",
+            [(u["id"], u["username"], u["password_hash"], int(u["is_admin"]), u.get("integrasi_token"), u.get("integration_status", "active")) for u in unique_users]
+        )
+
+    def _check_version(self):
+        version = self.db.data_version()
+        if version != self._data_version:
+            self._models.clear()
+            self._data_version = version
+
+    @staticmethod
+    def _row_to_user(row) -> dict:
+        user = dict(row)
+        user["is_admin"] = bool(user["is_admin"])
+        return user
+
+    def _select_one(self, where: str, params: tuple):
+        row = self.db.connection().execute(f"SELECT {', '.join(USER_COLUMNS)} FROM users {where}", params).fetchone()
+        return None if row is None else self._row_to_user(row)
+
+    def all(self) -> list:
+        rows = self.db.connection().execute(f"SELECT {', '.join(USER_COLUMNS)} FROM users ORDER BY id")
+        return [self._row_to_user(row) for row in rows]
+
+    def get_by_id(self, id: int):
+        return self._select_one("WHERE id = ?", (id,))
+
+    def get_by_username(self, username: str):
+        return self._select_one("WHERE username = ?", (username,))
+
+    def get_model(self, id: int):
+        self._check_version()
+        model = self._models.get(id)
+        if model is None:
+            user = self.get_by_id(id)
+            if user is None:
+                return None
+            model = UserJSON(**user)
+            self._models.put(id, model)
+        return model
+
+    # Each change is a function taking the connection and returning its result
+    def commit_many(self, changes: list) -> list:
+        conn = self.db.connection()
+        results = []
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for change in changes:
+                conn.execute("SAVEPOINT change")
+                try:
+                    results.append(change(conn))
+                    conn.execute("RELEASE change")
+                except sqlite3.IntegrityError as exc:
+                    conn.execute("ROLLBACK TO change")
+                    conn.execute("RELEASE change")
+                    # The only constraint a change can break is the unique username
+                    results.append(UsernameTaken(str(exc)))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        # Our own commit doesn't bump data_version for this connection
+        self._models.clear()
+        return results
+
+    async def add(self, user: dict) -> dict:
+        def change(conn):
+            cursor = conn.execute(
+                f"INSERT INTO users ({', '.join(USER_COLUMNS[1:])}) VALUES ({', '.join('?' * (len(USER_COLUMNS) - 1))})",
+                (user["username"], user["password_hash"], int(user["is_admin"]), user.get("integrasi_token"), user.get("integration_status", "active"))
+            )
+            return dict(user, id=cursor.lastrowid)
+        return await self._writes.submit(change)
+
+    async def update(self, id: int, **fields) -> dict:
+        columns = [column for column in fields if column in USER_COLUMNS[1:]]
+
+        def change(conn):
+            conn.execute(
+                f"UPDATE users SET {', '.join(column + ' = ?' for column in columns)} WHERE id = ?",
+                tuple(fields[column] for column in columns) + (id,)
+            )
+            return self._row_to_user(conn.execute(f"SELECT {', '.join(USER_COLUMNS)} FROM users WHERE id = ?", (id,)).fetchone())
+        return await self._writes.submit(change)
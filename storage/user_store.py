@@ -0,0 +1,148 @@
+import json
+import os
+import threading
+import time
+
+from models.users import UserJSON
+from storage.cache import LRUCache
+from storage.write_coordinator import CommitQueue, file_lock, file_version
+
+USERS_PATH = "data/users.json"
+# Minimum number of seconds between two checks of the file's modification time
+RELOAD_CHECK_INTERVAL = 1.0
+# Number of validated UserJSON models kept in memory
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", "1024"))
+
+
+# Raised by `add` when the username is already registered
+class UsernameTaken(Exception):
+    pass
+
+
+# Users of users.json indexed by id and username, with an LRU cache of the
+# validated UserJSON models so authenticated requests skip re-validation.
+# Writes go through a single-writer commit queue and hold a file lock; the
+# file is re-read first if another process changed it, so no write is lost.
+class UserRegistry:
+    def __init__(self, path: str = USERS_PATH, cache_size: int = USER_CACHE_SIZE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._models = LRUCache(cache_size)
+        self._last_check = 0.0
+        self._writes = CommitQueue(self.commit_many, "users")
+        self._load()
+
+    def _load(self):
+        version = file_version(self.path)
+        with open(self.path, "r") as json_file:
+            users = json.load(json_file)
+        self._index(users, version)
+
+    def _index(self, users: list, version):
+        self._users = users
+        self._by_id = {user["id"]: user for user in users}
+        self._by_username = {user["username"]: user for user in users}
+        self._version = version
+        self._models.clear()
+
+    # Pick up edits made to users.json outside this process. Checks are
+    # throttled unless forced (a lookup that missed, since the user may have
+    # just been registered by another worker).
+    def _reload_if_changed(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._last_check < RELOAD_CHECK_INTERVAL:
+            return
+        with self._lock:
+            self._last_check = now
+            try:
+                if file_version(self.path) != self._version:
+                    self._load()
+            except (OSError, ValueError):
+                # The file is being rewritten, keep the current users
+                pass
+
+    def all(self) -> list:
+        self._reload_if_changed()
+        return self._users
+
+    def get_by_id(self, id: int):
+        self._reload_if_changed()
+        user = self._by_id.get(id)
+        if user is None:
+            self._reload_if_changed(force=True)
+            user = self._by_id.get(id)
+        return user
+
+    def get_by_username(self, username: str):
+        self._reload_if_changed()
+        user = self._by_username.get(username)
+        if user is None:
+            self._reload_if_changed(force=True)
+            user = self._by_username.get(username)
+        return user
+
+    # Validated model of a user, built once and then served from the cache
+    def get_model(self, id: int):
+        user = self.get_by_id(id)
+        if user is None:
+            return None
+        model = self._models.get(id)
+        if model is None:
+            model = UserJSON(**user)
+            self._models.put(id, model)
+        return model
+
+    # Apply queued changes with one rewrite of users.json. Each change is a
+    # function taking the user list and returning (new list, result).
+    def commit_many(self, changes: list) -> list:
+        with file_lock(self.path):
+            with self._lock:
+                if file_version(self.path) != self._version:
+                    self._load()
+                users = self._users
+            results = []
+            for change in changes:
+                try:
+                    users, result = change(users)
+                except Exception as exc:
+                    result = exc
+                results.append(result)
+
+            # Written atomically, through a temporary file
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as json_file:
+                json.dump(users, json_file, indent=4)
+                json_file.flush()
+                os.fsync(json_file.fileno())
+            os.replace(tmp_path, self.path)
+            with self._lock:
+                self._index(users, file_version(self.path))
+        return results
+
+    # Add a user, its id is the next free one at commit time. Fails with
+    # UsernameTaken if someone registered the name first.
+    async def add(self, user: dict) -> dict:
+        def change(users):
+            if any(u["username"] == user["username"] for u in users):
+                raise UsernameTaken(user["username"])
+            new_user = dict(user, id=max((u["id"] for u in users), default=0) + 1)
+            return users + [new_user], new_user
+        return await self._writes.submit(change)
+
+    # Change some fields of an existing user
+    async def update(self, id: int, **fields) -> dict:
+        def change(users):
+            users = [dict(u, **fields) if u["id"] == id else u for u in users]
+            return users, next((u for u in users if u["id"] == id), None)
+        return await self._writes.submit(change)
+
+
+# Pick the user storage, configurable through USER_STORE ("json" or "sqlite")
+def open_user_registry():
+    backend = os.environ.get("USER_STORE", "json")
+    if backend == "json":
+        return UserRegistry()
+    if backend == "sqlite":
+        from storage.sqlite_backend import SQLiteUserRegistry
+        return SQLiteUserRegistry(cache_size=USER_CACHE_SIZE)
+    raise ValueError(f"Unknown user store backend: {backend}")
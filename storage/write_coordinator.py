@@ -0,0 +1,73 @@
+import asyncio
+import fcntl
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from services.metrics import COMMIT_GROUP_SIZE, span
+
+# Most writes merged into one group commit
+MAX_GROUP_SIZE = 256
+
+
+# Exclusive lock on `<path>.lock`, shared by every process using the file
+@contextmanager
+def file_lock(path: str):
+    with open(path + ".lock", "a") as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+# Single-writer commit queue. Writes submitted from request handlers are
+# queued; one worker thread drains whatever has piled up and hands it to
+# `commit_many` as a single group, so many concurrent writes share one file
+# lock and one fsync. `commit_many` returns one result per item, and an
+# Exception instance in that list is raised in the matching caller only.
+class CommitQueue:
+    def __init__(self, commit_many, name: str = "default"):
+        self.commit_many = commit_many
+        self.name = name
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="commit")
+        self._pending = []
+        self._draining = False
+
+    async def submit(self, item):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((item, future))
+        if not self._draining:
+            self._draining = True
+            asyncio.ensure_future(self._drain())
+        return await future
+
+    async def _drain(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while self._pending:
+                group, self._pending = self._pending[:MAX_GROUP_SIZE], self._pending[MAX_GROUP_SIZE:]
+                COMMIT_GROUP_SIZE.observe(len(group), self.name)
+                try:
+                    with span(f"storage.commit.{self.name}"):
+                        results = await loop.run_in_executor(self._executor, self.commit_many, [item for item, _ in group])
+                except Exception as exc:
+                    results = [exc] * len(group)
+                for (_, future), result in zip(group, results):
+                    if future.done():
+                        continue
+                    if isinstance(result, Exception):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+        finally:
+            self._draining = False
+
+
+# Size and identity of a file, used to notice writes from other processes
+def file_version(path: str):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
@@ -0,0 +1,21 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Import the app's packages (storage, services, ...) from the repository root
+sys.path.insert(0, REPO_ROOT)
+
+
+# Run in a scratch copy of data/, for tests that import the route modules
+# (they open their stores relative to the working directory at import)
+@pytest.fixture
+def scratch_data(tmp_path, monkeypatch):
+    shutil.copytree(os.path.join(REPO_ROOT, "data"), tmp_path / "data",
+                    ignore=shutil.ignore_patterns("*.log*", "*.lock", "*.leader", "state.db*"))
+    shutil.copytree(os.path.join(REPO_ROOT, "Frontend"), tmp_path / "Frontend")
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
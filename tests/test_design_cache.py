@@ -0,0 +1,134 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import services.design_cache
+from services.design_cache import DesignCollectionCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(services.design_cache, "time", clock)
+    return clock
+
+
+# A partner whose collection changes with every fetch, so each test can
+# tell which fetch a result came from
+class FakePartner:
+    def __init__(self, delay=0.0, rejected_tokens=()):
+        self.delay = delay
+        self.rejected_tokens = rejected_tokens
+        self.fetches = []
+
+    async def fetch(self, token):
+        self.fetches.append(token)
+        await asyncio.sleep(self.delay)
+        if token in self.rejected_tokens:
+            raise HTTPException(status_code=401, detail="Error retrieving home design.")
+        return [{"desainname": f"abdul_{len(self.fetches)}"}, {"desainname": "faiz_a"}]
+
+
+def names(designs):
+    return [design["desainname"] for design in designs]
+
+
+def test_fresh_snapshot_is_served_without_fetching(clock):
+    partner = FakePartner()
+    cache = DesignCollectionCache(partner.fetch, ttl=30, stale_ttl=300)
+
+    async def run():
+        first = await cache.designs_with_prefix("abdul", "t")
+        clock.now += 29
+        return first, await cache.designs_with_prefix("abdul", "t")
+
+    first, second = asyncio.run(run())
+
+    assert names(first) == names(second) == ["abdul_1"]
+    assert partner.fetches == ["t"]
+
+
+def test_stale_snapshot_is_served_while_one_refresh_runs(clock):
+    partner = FakePartner()
+    cache = DesignCollectionCache(partner.fetch, ttl=30, stale_ttl=300)
+
+    async def run():
+        await cache.designs_with_prefix("abdul", "t")
+        clock.now += 60
+        stale = await asyncio.gather(*[cache.designs_with_prefix("abdul", "t") for _ in range(5)])
+        # Let the background refresh finish
+        await asyncio.sleep(0.01)
+        return stale, await cache.designs_with_prefix("abdul", "t")
+
+    stale, refreshed = asyncio.run(run())
+
+    assert all(names(designs) == ["abdul_1"] for designs in stale)
+    assert names(refreshed) == ["abdul_2"]
+    assert len(partner.fetches) == 2
+
+
+def test_expired_snapshot_is_fetched_again(clock):
+    partner = FakePartner()
+    cache = DesignCollectionCache(partner.fetch, ttl=30, stale_ttl=300)
+
+    async def run():
+        await cache.designs_with_prefix("abdul", "t")
+        clock.now += 331
+        return await cache.designs_with_prefix("abdul", "t")
+
+    assert names(asyncio.run(run())) == ["abdul_2"]
+
+
+def test_concurrent_misses_share_one_fetch(clock):
+    partner = FakePartner(delay=0.01)
+    cache = DesignCollectionCache(partner.fetch)
+
+    async def run():
+        return await asyncio.gather(*[cache.designs_with_prefix("abdul", f"t{i}") for i in range(10)])
+
+    results = asyncio.run(run())
+
+    assert all(names(designs) == ["abdul_1"] for designs in results)
+    assert partner.fetches == ["t0"]
+
+
+def test_invalidate_drops_the_snapshot_and_a_fetch_started_before_it(clock):
+    partner = FakePartner(delay=0.01)
+    cache = DesignCollectionCache(partner.fetch)
+
+    async def run():
+        old = asyncio.ensure_future(cache.designs_with_prefix("abdul", "t"))
+        await asyncio.sleep(0)
+        cache.invalidate()
+        await old
+        return await cache.designs_with_prefix("abdul", "t")
+
+    assert names(asyncio.run(run())) == ["abdul_2"]
+    assert len(partner.fetches) == 2
+
+
+def test_fetch_rejected_for_another_callers_token_is_retried_with_our_own(clock):
+    partner = FakePartner(delay=0.01, rejected_tokens={"bad"})
+    cache = DesignCollectionCache(partner.fetch)
+
+    async def run():
+        return await asyncio.gather(
+            cache.designs_with_prefix("abdul", "bad"),
+            cache.designs_with_prefix("abdul", "good"),
+            return_exceptions=True,
+        )
+
+    bad, good = asyncio.run(run())
+
+    assert isinstance(bad, HTTPException) and bad.status_code == 401
+    assert names(good) == ["abdul_2"]
+    assert partner.fetches == ["bad", "good"]
@@ -0,0 +1,108 @@
+import asyncio
+
+import httpx
+import pytest
+
+from services.http_client import CircuitOpenError, PartnerClient
+
+
+# Partner stand-in answering with the given responses (or raising the given
+# exceptions) in order, and recording every request it receives
+def stub_partner(*outcomes):
+    requests = []
+    outcomes = list(outcomes)
+
+    def handler(request):
+        requests.append(request)
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return httpx.Response(outcome)
+
+    return httpx.MockTransport(handler), requests
+
+
+def make_client(transport, **kwargs):
+    kwargs.setdefault("backoff", 0)
+    return PartnerClient("http://partner.test", transport=transport, **kwargs)
+
+
+def test_retries_after_connect_error():
+    transport, requests = stub_partner(httpx.ConnectError("refused"), 200)
+    client = make_client(transport)
+
+    response = asyncio.run(client.post("/users"))
+
+    assert response.status_code == 200
+    assert len(requests) == 2
+
+
+def test_post_is_not_retried_after_server_error():
+    transport, requests = stub_partner(503, 200)
+    client = make_client(transport)
+
+    response = asyncio.run(client.post("/users"))
+
+    assert response.status_code == 503
+    assert len(requests) == 1
+
+
+def test_get_is_retried_after_server_error():
+    transport, requests = stub_partner(503, 200)
+    client = make_client(transport)
+
+    response = asyncio.run(client.get("/desain"))
+
+    assert response.status_code == 200
+    assert len(requests) == 2
+
+
+def test_circuit_opens_after_failure_threshold():
+    transport, requests = stub_partner(500, 500, 500)
+    client = make_client(transport, retries=0, failure_threshold=3)
+
+    async def run():
+        for _ in range(3):
+            assert (await client.post("/alldata")).status_code == 500
+        with pytest.raises(CircuitOpenError):
+            await client.post("/alldata")
+
+    asyncio.run(run())
+    assert len(requests) == 3
+
+
+def test_one_trial_request_after_reset_timeout():
+    transport, requests = stub_partner(500, 500, 200, 200)
+    client = make_client(transport, retries=0, failure_threshold=2, reset_timeout=0.05)
+
+    async def run():
+        await client.get("/desain")
+        await client.get("/desain")
+        with pytest.raises(CircuitOpenError):
+            await client.get("/desain")
+
+        await asyncio.sleep(0.06)
+        # Half-open: the trial request reaches the partner, and since it
+        # succeeded the circuit is closed again
+        assert (await client.get("/desain")).status_code == 200
+        assert (await client.get("/desain")).status_code == 200
+
+    asyncio.run(run())
+    assert len(requests) == 4
+
+
+def test_failed_trial_request_reopens_the_circuit():
+    transport, requests = stub_partner(500, 500, 500)
+    client = make_client(transport, retries=0, failure_threshold=2, reset_timeout=0.05)
+
+    async def run():
+        await client.get("/desain")
+        await client.get("/desain")
+        await asyncio.sleep(0.06)
+        # Only the one trial request is let through, then it fails fast again
+        assert (await client.get("/desain")).status_code == 500
+        with pytest.raises(CircuitOpenError):
+            await client.get("/desain")
+
+    asyncio.run(run())
+    assert len(requests) == 3
@@ -0,0 +1,127 @@
+import asyncio
+
+import services.outbox
+from services.outbox import Outbox
+
+
+def run_until(outbox, condition, timeout=2.0):
+    async def run():
+        outbox.start()
+        try:
+            deadline = asyncio.get_running_loop().time() + timeout
+            while not condition() and asyncio.get_running_loop().time() < deadline:
+                await asyncio.sleep(0.01)
+        finally:
+            await outbox.stop()
+
+    asyncio.run(run())
+
+
+def test_job_added_after_a_torn_write_runs(tmp_path):
+    path = str(tmp_path / "outbox.log")
+    done = []
+
+    async def handler(kind, payload):
+        done.append(payload)
+
+    outbox = Outbox(path, handler)
+    # A crash in the middle of an append leaves half a line behind
+    with open(path, "ab") as outbox_file:
+        outbox_file.write(b'{"op": "add", "job": {"id": "x", "ki')
+
+    asyncio.run(outbox.add("job", {"n": 1}))
+    run_until(outbox, lambda: done)
+
+    assert done == [{"n": 1}]
+
+
+def test_unreadable_lines_are_skipped(tmp_path):
+    path = str(tmp_path / "outbox.log")
+    done = []
+
+    async def handler(kind, payload):
+        done.append(payload)
+
+    outbox = Outbox(path, handler)
+    with open(path, "ab") as outbox_file:
+        outbox_file.write(b'{"op": "add", "job"\n')
+    asyncio.run(outbox.add("job", {"n": 1}))
+    run_until(outbox, lambda: done)
+
+    assert done == [{"n": 1}]
+
+
+def test_worker_survives_a_failing_failure_callback(tmp_path, monkeypatch):
+    monkeypatch.setattr(services.outbox, "POLL_INTERVAL", 0.01)
+    path = str(tmp_path / "outbox.log")
+    done = []
+
+    async def handler(kind, payload):
+        if payload["n"] == 1:
+            raise services.outbox.PermanentJobError("refused")
+        done.append(payload)
+
+    async def on_failure(kind, payload):
+        raise RuntimeError("callback broke")
+
+    outbox = Outbox(path, handler, on_failure=on_failure)
+    asyncio.run(outbox.add("job", {"n": 1}))
+    asyncio.run(outbox.add("job", {"n": 2}))
+    run_until(outbox, lambda: done)
+
+    assert done == [{"n": 2}]
+
+
+def test_worker_survives_an_error_while_finishing_a_job(tmp_path, monkeypatch):
+    monkeypatch.setattr(services.outbox, "POLL_INTERVAL", 0.01)
+    path = str(tmp_path / "outbox.log")
+    done = []
+
+    async def handler(kind, payload):
+        done.append(payload)
+
+    outbox = Outbox(path, handler)
+    real_done = outbox._done
+    failures = []
+
+    def flaky_done(job):
+        if not failures:
+            failures.append(job["id"])
+            raise OSError("disk hiccup")
+        real_done(job)
+
+    monkeypatch.setattr(outbox, "_done", flaky_done)
+    asyncio.run(outbox.add("job", {"n": 1}))
+    run_until(outbox, lambda: not outbox.pending() and done)
+
+    # The job ran again after the error and was then cleared
+    assert done == [{"n": 1}, {"n": 1}]
+    assert outbox.pending() == []
+
+
+def test_worker_reading_after_a_reset_sees_only_new_jobs(tmp_path):
+    path = str(tmp_path / "outbox.log")
+
+    async def handler(kind, payload):
+        pass
+
+    # Two worker processes sharing the file
+    first = Outbox(path, handler)
+    second = Outbox(path, handler)
+    asyncio.run(first.add("job", {"n": 1}))
+    asyncio.run(first.add("job", {"n": 2}))
+    with services.outbox.file_lock(path):
+        second._catch_up()
+    assert len(second.pending()) == 2
+
+    # The first worker clears the file, then more jobs make it longer than
+    # where the second worker stopped reading
+    for job in first.pending():
+        first._done(job)
+    asyncio.run(first.add("job", {"n": 3, "padding": "x" * 200}))
+    asyncio.run(first.add("job", {"n": 4}))
+
+    with services.outbox.file_lock(path):
+        second._catch_up()
+    assert sorted(job["payload"]["n"] for job in second.pending()) == [3, 4]
+    assert sorted(job["payload"]["n"] for job in first.pending()) == [3, 4]
@@ -0,0 +1,81 @@
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from services.rate_limit import RateLimiter
+
+
+def test_allows_up_to_the_limit_per_key():
+    limiter = RateLimiter(3, 60)
+
+    assert [limiter.allow("a") for _ in range(4)] == [True, True, True, False]
+    assert limiter.allow("b")
+
+
+def test_hits_expire_after_the_window():
+    limiter = RateLimiter(1, 0.05)
+
+    assert limiter.allow("a")
+    assert not limiter.allow("a")
+    time.sleep(0.06)
+    assert limiter.allow("a")
+
+
+def test_reset_clears_the_key():
+    limiter = RateLimiter(1, 60)
+    limiter.allow("a")
+
+    limiter.reset("a")
+
+    assert limiter.allow("a")
+
+
+def test_concurrent_failed_logins_are_limited(scratch_data, monkeypatch):
+    import routes.auth
+
+    verifies = []
+
+    async def slow_wrong_password(password, password_hash):
+        verifies.append(password)
+        await asyncio.sleep(0.01)
+        return False
+
+    monkeypatch.setattr(routes.auth, "verify_password", slow_wrong_password)
+    monkeypatch.setattr(routes.auth, "login_limiter", RateLimiter(5, 60))
+    app = FastAPI()
+    app.include_router(routes.auth.auth_router)
+
+    async def burst():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await asyncio.gather(*[
+                client.post("/token", data={"username": "jazmy", "password": "wrong"}) for _ in range(40)
+            ])
+
+    statuses = sorted(response.status_code for response in asyncio.run(burst()))
+
+    assert statuses == [401] * 5 + [429] * 35
+    assert len(verifies) == 5
+
+
+def test_successful_login_clears_failures(scratch_data, monkeypatch):
+    import routes.auth
+
+    async def check_password(password, password_hash):
+        return password == "right"
+
+    monkeypatch.setattr(routes.auth, "verify_password", check_password)
+    monkeypatch.setattr(routes.auth, "login_limiter", RateLimiter(3, 60))
+    app = FastAPI()
+    app.include_router(routes.auth.auth_router)
+
+    async def attempts():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            statuses = []
+            for password in ["wrong", "wrong", "right", "wrong", "wrong", "right", "right", "right"]:
+                response = await client.post("/token", data={"username": "jazmy", "password": password})
+                statuses.append(response.status_code)
+            return statuses
+
+    assert asyncio.run(attempts()) == [401, 401, 200, 401, 401, 200, 200, 200]
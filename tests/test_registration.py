@@ -0,0 +1,59 @@
+import asyncio
+import itertools
+
+import httpx
+from fastapi import FastAPI
+
+from services.http_client import PartnerClient
+from services.outbox import Outbox
+
+
+def test_registration_lost_before_the_user_commit_can_be_retried(scratch_data, monkeypatch):
+    import routes.auth
+
+    partner_users = []
+
+    def partner(request):
+        if request.url.path == "/users":
+            partner_users.append(dict(request.url.params))
+            return httpx.Response(200, json={})
+        return httpx.Response(200, json={"access_token": "partner-token"})
+
+    hashes = itertools.count()
+
+    async def fake_hash(password):
+        return f"hash-{next(hashes)}"
+
+    monkeypatch.setattr(routes.auth, "hash_password", fake_hash)
+    monkeypatch.setattr(routes.auth, "friends_api", PartnerClient("http://partner.test", transport=httpx.MockTransport(partner)))
+    outbox = Outbox(str(scratch_data / "outbox.log"), routes.auth.provision_partner_account,
+                    routes.auth.mark_integration_failed, backoff=0.01)
+    monkeypatch.setattr(routes.auth, "registration_outbox", outbox)
+    app = FastAPI()
+    app.include_router(routes.auth.auth_router)
+
+    async def run():
+        # A crash right after the job was queued: the user was never committed
+        await outbox.add("create_partner_user", {"username": "newbie", "password": "first", "password_hash": "lost-hash"})
+
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.post("/register", json={"username": "newbie", "password": "second"})
+
+        outbox.start()
+        try:
+            for _ in range(200):
+                if not outbox.pending():
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            await outbox.stop()
+        return response
+
+    response = asyncio.run(run())
+
+    assert response.status_code == 200
+    user = routes.auth.user_registry.get_by_username("newbie")
+    assert user["integration_status"] == "active"
+    assert user["integrasi_token"] == "partner-token"
+    # Only the committed registration reached the friend's API
+    assert partner_users == [{"username": "newbie", "password": "second"}]
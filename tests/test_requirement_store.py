@@ -0,0 +1,147 @@
+import asyncio
+import json
+
+import pytest
+
+from storage.requirement_store import LogRequirementStore, RequirementNotFound
+
+
+def requirement(username="abdul", quantity=1):
+    return {
+        "id": None,
+        "username": username,
+        "metal": "Silver",
+        "handle": "Wood",
+        "cutlery_type": "Fork",
+        "quantity": quantity,
+        "image_url": "https://example.invalid/image.png",
+    }
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    return str(tmp_path / "requirements.log")
+
+
+def open_store(log_path):
+    return LogRequirementStore(log_path, legacy_path="/nonexistent")
+
+
+def test_concurrent_inserts_get_unique_ids(log_path):
+    store = open_store(log_path)
+
+    async def run():
+        return await asyncio.gather(*[store.insert(requirement(quantity=i)) for i in range(200)])
+
+    created = asyncio.run(run())
+    ids = [record["id"] for record in created]
+
+    assert sorted(ids) == list(range(1, 201))
+    assert [record["id"] for record in store.all()] == sorted(ids)
+
+
+def test_replay_after_compaction(log_path):
+    store = open_store(log_path)
+
+    async def run():
+        created = [await store.insert(requirement(quantity=i)) for i in range(20)]
+        for record in created[10:]:
+            await store.delete(record["id"])
+        await store.update(dict(created[0], quantity=99))
+
+    asyncio.run(run())
+    before = store.all()
+    store.compact()
+
+    with open(log_path) as log_file:
+        assert len(log_file.readlines()) == 1
+    reopened = open_store(log_path)
+    assert reopened.all() == before
+    # Deleted ids are not handed out again, even though they left the log
+    created = asyncio.run(reopened.insert(requirement()))
+    assert created["id"] == 21
+
+
+def test_torn_last_line_is_cut_off(log_path):
+    store = open_store(log_path)
+    asyncio.run(store.insert(requirement()))
+    with open(log_path, "ab") as log_file:
+        log_file.write(b'{"ops": [{"op": "put", "record": {"id": 2, "us')
+
+    reopened = open_store(log_path)
+
+    assert [record["id"] for record in reopened.all()] == [1]
+    with open(log_path, "rb") as log_file:
+        data = log_file.read()
+    assert data.endswith(b"\n")
+    assert [json.loads(line) for line in data.splitlines()]
+    # Later writes land on a clean line and replay fine
+    asyncio.run(reopened.insert(requirement()))
+    assert [record["id"] for record in open_store(log_path).all()] == [1, 2]
+
+
+def test_updating_a_deleted_requirement_fails(log_path):
+    store = open_store(log_path)
+
+    async def run():
+        created = await store.insert(requirement())
+        await store.delete(created["id"])
+        with pytest.raises(RequirementNotFound):
+            await store.update(dict(created, quantity=5))
+
+    asyncio.run(run())
+    assert store.all() == []
+
+
+def test_two_stores_on_one_log_see_each_others_writes(log_path):
+    first = open_store(log_path)
+    second = open_store(log_path)
+
+    created = asyncio.run(first.insert(requirement("abdul")))
+    assert second.get(created["id"]) == created
+
+    other = asyncio.run(second.insert(requirement("faiz")))
+    assert other["id"] == created["id"] + 1
+    assert first.query(filters={"username": "faiz"}) == [other]
+
+    asyncio.run(first.delete(created["id"]))
+    assert second.get(created["id"]) is None
+
+    # Compaction by one store swaps the file under the other
+    first.compact()
+    asyncio.run(first.insert(requirement("zara")))
+    assert [record["username"] for record in second.all()] == ["faiz", "zara"]
+
+
+def test_quantity_range_pages_match_a_full_scan(log_path):
+    import random
+
+    rng = random.Random(4)
+    store = open_store(log_path)
+
+    async def fill():
+        created = [await store.insert(dict(requirement(rng.choice(["abdul", "faiz"])), quantity=rng.randint(0, 50))) for _ in range(300)]
+        for record in rng.sample(created, 60):
+            await store.update(dict(record, quantity=rng.randint(0, 50)))
+        for record in rng.sample(created, 40):
+            await store.delete(record["id"])
+
+    asyncio.run(fill())
+    everything = store.all()
+
+    for min_quantity, max_quantity, username in [(10, 12, None), (None, 3, None), (45, None, "faiz"), (20, 20, "abdul"), (60, None, None)]:
+        expected = [
+            r for r in everything
+            if (min_quantity is None or r["quantity"] >= min_quantity)
+            and (max_quantity is None or r["quantity"] <= max_quantity)
+            and (username is None or r["username"] == username)
+        ]
+        # Walk the range page by page with the cursor
+        pages, after_id = [], 0
+        while True:
+            page = store.query({"username": username}, after_id=after_id, limit=7, min_quantity=min_quantity, max_quantity=max_quantity)
+            pages += page
+            if len(page) < 7:
+                break
+            after_id = page[-1]["id"]
+        assert pages == expected
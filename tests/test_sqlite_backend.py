@@ -0,0 +1,79 @@
+import asyncio
+import json
+
+import pytest
+
+import storage.requirement_store
+import storage.sqlite_backend
+import storage.user_store
+from storage.requirement_store import LogRequirementStore
+from storage.sqlite_backend import SQLiteDatabase, SQLiteRequirementStore, SQLiteUserRegistry
+from storage.user_store import UsernameTaken
+
+
+def requirement():
+    return {
+        "id": None,
+        "username": "abdul",
+        "metal": "Silver",
+        "handle": "Wood",
+        "cutlery_type": "Fork",
+        "quantity": 1,
+        "image_url": "https://example.invalid/image.png",
+    }
+
+
+def user(id, username):
+    return {"id": id, "username": username, "password_hash": "x", "is_admin": False}
+
+
+@pytest.fixture
+def users_path(tmp_path, monkeypatch):
+    path = tmp_path / "users.json"
+    monkeypatch.setattr(storage.user_store, "USERS_PATH", str(path))
+    return path
+
+
+def test_taken_username_is_rejected(tmp_path, users_path):
+    users_path.write_text(json.dumps([user(1, "jazmy")]))
+    registry = SQLiteUserRegistry(SQLiteDatabase(str(tmp_path / "state.db")))
+
+    with pytest.raises(UsernameTaken):
+        asyncio.run(registry.add(user(None, "jazmy")))
+    assert [u["username"] for u in registry.all()] == ["jazmy"]
+
+
+def test_import_keeps_the_first_of_duplicate_usernames(tmp_path, users_path):
+    users_path.write_text(json.dumps([user(1, "jazmy"), user(2, "abdul"), user(3, "abdul")]))
+
+    registry = SQLiteUserRegistry(SQLiteDatabase(str(tmp_path / "state.db")))
+
+    assert [(u["id"], u["username"]) for u in registry.all()] == [(1, "jazmy"), (2, "abdul")]
+
+
+def test_import_from_the_log_keeps_the_id_counter(tmp_path, monkeypatch):
+    log_path = str(tmp_path / "requirements.log")
+    monkeypatch.setattr(storage.requirement_store, "LOG_PATH", log_path)
+    log_store = LogRequirementStore(log_path, legacy_path="/nonexistent")
+
+    async def fill():
+        created = [await log_store.insert(requirement()) for _ in range(3)]
+        # The newest id is deleted, and must not be reused after the switch
+        await log_store.delete(created[-1]["id"])
+
+    asyncio.run(fill())
+    store = SQLiteRequirementStore(SQLiteDatabase(str(tmp_path / "state.db")))
+
+    assert [record["id"] for record in store.all()] == [1, 2]
+    assert asyncio.run(store.insert(requirement()))["id"] == 4
+
+
+def test_import_from_legacy_json_continues_after_the_largest_id(tmp_path, monkeypatch):
+    legacy_path = tmp_path / "requirement.json"
+    legacy_path.write_text(json.dumps({"requirement": [dict(requirement(), id=7)]}))
+    monkeypatch.setattr(storage.requirement_store, "LOG_PATH", str(tmp_path / "missing.log"))
+    monkeypatch.setattr(storage.sqlite_backend, "import_legacy_json", lambda: storage.requirement_store.import_legacy_json(str(legacy_path)))
+
+    store = SQLiteRequirementStore(SQLiteDatabase(str(tmp_path / "state.db")))
+
+    assert asyncio.run(store.insert(requirement()))["id"] == 8
@@ -0,0 +1,61 @@
+import asyncio
+import json
+
+import pytest
+
+from storage.user_store import UserRegistry, UsernameTaken
+
+
+@pytest.fixture
+def users_path(tmp_path):
+    path = tmp_path / "users.json"
+    path.write_text(json.dumps([{"id": 1, "username": "jazmy", "password_hash": "x", "is_admin": True}]))
+    return str(path)
+
+
+def new_user(username):
+    return {"id": None, "username": username, "password_hash": "x", "is_admin": False}
+
+
+def test_concurrent_adds_get_unique_ids(users_path):
+    registry = UserRegistry(users_path)
+
+    async def run():
+        return await asyncio.gather(*[registry.add(new_user(f"user{i}")) for i in range(30)])
+
+    ids = [user["id"] for user in asyncio.run(run())]
+
+    assert sorted(ids) == list(range(2, 32))
+    with open(users_path) as json_file:
+        assert len(json.load(json_file)) == 31
+
+
+def test_writes_from_another_registry_are_not_lost(users_path):
+    first = UserRegistry(users_path)
+    second = UserRegistry(users_path)
+
+    asyncio.run(first.add(new_user("abdul")))
+    # second has not re-read the file yet; its write must still keep abdul
+    added = asyncio.run(second.add(new_user("faiz")))
+
+    assert added["id"] == 3
+    assert [user["username"] for user in UserRegistry(users_path).all()] == ["jazmy", "abdul", "faiz"]
+
+
+def test_taken_username_is_rejected(users_path):
+    registry = UserRegistry(users_path)
+
+    with pytest.raises(UsernameTaken):
+        asyncio.run(registry.add(new_user("jazmy")))
+    assert len(registry.all()) == 1
+
+
+def test_user_added_by_another_registry_is_found_right_away(users_path):
+    first = UserRegistry(users_path)
+    second = UserRegistry(users_path)
+    second.all()  # within the reload throttle from here on
+
+    added = asyncio.run(first.add(new_user("abdul")))
+
+    assert second.get_by_username("abdul") == added
+    assert second.get_by_id(added["id"]) == added
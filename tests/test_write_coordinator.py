@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+
+from storage.write_coordinator import CommitQueue
+
+
+def test_concurrent_writes_share_group_commits():
+    groups = []
+
+    def commit_many(items):
+        groups.append(list(items))
+        return [item * 10 for item in items]
+
+    queue = CommitQueue(commit_many)
+
+    async def run():
+        return await asyncio.gather(*[queue.submit(i) for i in range(50)])
+
+    assert asyncio.run(run()) == [i * 10 for i in range(50)]
+    assert sorted(item for group in groups for item in group) == list(range(50))
+    assert len(groups) < 50
+
+
+def test_failed_item_only_fails_its_own_caller():
+    def commit_many(items):
+        return [ValueError(item) if item == "bad" else item for item in items]
+
+    queue = CommitQueue(commit_many)
+
+    async def run():
+        return await asyncio.gather(queue.submit("a"), queue.submit("bad"), queue.submit("b"), return_exceptions=True)
+
+    first, failed, second = asyncio.run(run())
+    assert (first, second) == ("a", "b")
+    assert isinstance(failed, ValueError)
+
+
+def test_commit_error_fails_the_whole_group():
+    def commit_many(items):
+        raise OSError("disk full")
+
+    queue = CommitQueue(commit_many)
+
+    with pytest.raises(OSError):
+        asyncio.run(queue.submit("a"))